@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import axios from 'axios';
+import { runJob } from './jobs';
 
 const Analyze = () => {
   const [result, setResult] = useState('');
@@ -10,13 +10,17 @@ const Analyze = () => {
   // Function to fetch the analysis data
   const fetchAnalysis = async () => {
     try {
-      const response = await axios.get('http://127.0.0.1:5000/compare-audio');
-      if (response.data.error) {
-        setError(response.data.error);
+      const sessionId = sessionStorage.getItem('tunesyncSessionId');
+      const data = await runJob({
+        url: 'http://127.0.0.1:5000/compare-audio',
+        params: sessionId ? { session_id: sessionId } : {},
+      });
+      if (data.error) {
+        setError(data.error);
         console.log("error")
         setResult('');
       } else {
-        setResult(response.data.result);
+        setResult(data.result);
         console.log("result")
         setError('');
       }
@@ -1,5 +1,6 @@
 // AudioProcessor.js
 import React, { useState } from 'react';
+import { runJob } from './jobs';
 
 const AudioProcessor = () => {
   const [youtubeLink, setYoutubeLink] = useState("");
@@ -18,23 +19,26 @@ const AudioProcessor = () => {
     setHasFetched(true); // Mark that we've fetched at least once
 
     try {
-      const response = await fetch("http://127.0.0.1:5000/process_youtube", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ youtube_url: youtubeLink })
+      const result = await runJob({
+        method: "post",
+        url: "http://127.0.0.1:5000/process_youtube",
+        data: { youtube_url: youtubeLink }
       });
 
-      if (!response.ok) {
-        throw new Error("Failed to fetch waveform data");
+      if (result.error) {
+        throw new Error(result.error);
       }
 
-      const result = await response.json();
       console.log("Raw API Response:", result);
 
       // Process waveform data before storing in state
       const processedData = processWaveform(result);
       setData(processedData); // store array of {time, dynamics}
       setAudioUrl(result.audio_file_url);
+      // Later uploads and comparisons refer to this reference by session ID
+      if (result.session_id) {
+        sessionStorage.setItem("tunesyncSessionId", result.session_id);
+      }
 
       setLoading(false);
     } catch (error) {
@@ -0,0 +1,31 @@
+import axios from 'axios';
+
+// The slow endpoints (/process_youtube, /compare-audio) are submitted as
+// server-side jobs (?async=1) and polled, so no request holds a server
+// worker while a download, Gemini call or scoring runs.
+const POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Resolves with the job's result, the same JSON the blocking endpoint returns.
+// A rejected request or failed job resolves as { error } as well.
+export const runJob = async (config) => {
+  const response = await axios({
+    ...config,
+    params: { ...config.params, async: 1 },
+    validateStatus: () => true,
+  });
+  if (response.status !== 202) {
+    return response.data && response.data.error
+      ? response.data
+      : { error: `Request failed with status ${response.status}` };
+  }
+
+  const statusUrl = response.data.status_url;
+  for (;;) {
+    await sleep(POLL_INTERVAL_MS);
+    const { data: job } = await axios.get(statusUrl, { validateStatus: () => true });
+    if (job.status === 'done') return job.result;
+    if (job.status === 'failed' || !job.status) return { error: job.error || 'Job not found' };
+  }
+};
@@ -1,5 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
+import { runJob } from './jobs';
 import AudioProcessor from "./audioprocessor";
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 
@@ -87,6 +87,10 @@ const Record = () => {
   const uploadAudio = async (audioBlob) => {
     const formData = new FormData();
     formData.append('file', audioBlob, 'recording.wav');
+    const sessionId = sessionStorage.getItem('tunesyncSessionId');
+    if (sessionId) {
+      formData.append('session_id', sessionId);
+    }
 
     try {
       const response = await fetch('http://127.0.0.1:5000/upload', {
@@ -121,15 +125,19 @@ const Record = () => {
     setAnalysisError('');
     
     try {
-      const response = await axios.get('http://127.0.0.1:5000/compare-audio');
-      if (response.data.error) {
-        setAnalysisError(response.data.error);
+      const sessionId = sessionStorage.getItem('tunesyncSessionId');
+      const data = await runJob({
+        url: 'http://127.0.0.1:5000/compare-audio',
+        params: sessionId ? { session_id: sessionId } : {},
+      });
+      if (data.error) {
+        setAnalysisError(data.error);
         setAnalysisResult('');
       } else {
-        //const {result, score} = response.data;
-        //console.log("Raw result:", response.data.result);
-        setAnalysisResult(response.data.result);
-        setAnalysisScore(response.data.score);
+        //const {result, score} = data;
+        //console.log("Raw result:", data.result);
+        setAnalysisResult(data.result);
+        setAnalysisScore(data.score);
         setAnalysisError('');
       }
     } catch (err) {
@@ -6,13 +6,83 @@ const useRecordingProcessor = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [audioURL, setAudioURL] = useState(null);
   const [userData, setUserData] = useState(null);
+  const [liveData, setLiveData] = useState(null);
   const mediaRecorderRef = useRef(null);
   const audioChunksRef = useRef([]);
+  const liveRef = useRef(null);
+  const liveStreamedRef = useRef(false);
+
+  // Streams raw PCM to the server while recording; dynamics, onsets and
+  // alignment come back over the same WebSocket
+  const startLiveStream = (stream, sessionId) => {
+    const audioContext = new AudioContext();
+    const source = audioContext.createMediaStreamSource(stream);
+    const processor = audioContext.createScriptProcessor(4096, 1, 1);
+    const socket = new WebSocket(
+      `ws://localhost:5000/sessions/${sessionId}/live?sr=${audioContext.sampleRate}`
+    );
+    socket.binaryType = "arraybuffer";
+    liveStreamedRef.current = true;
+    socket.onerror = () => {
+      // Fall back to uploading the take when recording stops
+      liveStreamedRef.current = false;
+    };
+
+    const live = { times: [], dynamics: [], onsets: [], alignment: null };
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === "dynamics") {
+        live.times = live.times.concat(message.times);
+        live.dynamics = live.dynamics.concat(message.dynamics);
+      } else if (message.type === "onsets") {
+        live.onsets = live.onsets.concat(message.times);
+      } else if (message.type === "alignment") {
+        live.alignment = message;
+      } else if (message.type === "done") {
+        // Same shape as the /upload response, so no upload is needed
+        setUserData(message);
+        setIsLoading(false);
+        socket.close();
+      }
+      setLiveData({ ...live });
+    };
+
+    processor.onaudioprocess = (event) => {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(new Float32Array(event.inputBuffer.getChannelData(0)).buffer);
+      }
+    };
+    source.connect(processor);
+    processor.connect(audioContext.destination);
+
+    liveRef.current = { audioContext, processor, socket };
+  };
+
+  const stopLiveStream = () => {
+    const live = liveRef.current;
+    if (!live) return;
+    live.processor.disconnect();
+    live.audioContext.close();
+    if (live.socket.readyState === WebSocket.OPEN) {
+      setIsLoading(true);
+      live.socket.send(JSON.stringify({ type: "stop" }));
+    } else {
+      liveStreamedRef.current = false;
+    }
+    liveRef.current = null;
+  };
 
   const startRecording = async () => {
     const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
     mediaRecorderRef.current = new MediaRecorder(stream);
 
+    liveStreamedRef.current = false;
+    const liveSessionId = sessionStorage.getItem("tunesyncSessionId");
+    if (liveSessionId) {
+      setLiveData(null);
+      startLiveStream(stream, liveSessionId);
+    }
+
     mediaRecorderRef.current.ondataavailable = (event) => {
       if (event.data.size > 0) {
         audioChunksRef.current.push(event.data);
@@ -20,10 +90,19 @@ const useRecordingProcessor = () => {
     };
 
     mediaRecorderRef.current.onstop = async () => {
-      setIsLoading(true);
       const audioBlob = new Blob(audioChunksRef.current, { type: "audio/mp3" });
+      if (liveStreamedRef.current) {
+        // The server already has the take; the result arrives on the WebSocket
+        setAudioURL(URL.createObjectURL(audioBlob));
+        return;
+      }
+      setIsLoading(true);
       const formData = new FormData();
       formData.append("file", audioBlob, "recording.mp3");
+      const sessionId = sessionStorage.getItem("tunesyncSessionId");
+      if (sessionId) {
+        formData.append("session_id", sessionId);
+      }
 
       try {
         const response = await fetch("http://localhost:5000/upload", {
@@ -48,11 +127,12 @@ const useRecordingProcessor = () => {
   const stopRecording = () => {
     if (mediaRecorderRef.current) {
       mediaRecorderRef.current.stop();
+      stopLiveStream();
       setIsRecording(false);
     }
   };
 
-  return { isRecording, startRecording, stopRecording, isLoading, audioURL, userData };
+  return { isRecording, startRecording, stopRecording, isLoading, audioURL, userData, liveData };
 };
 
 export default useRecordingProcessor;
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Module Name: alignment.py
+Date: 2026-10-18
+Description:
+    Alignment engine for match.py. The global offset between two recordings
+    is found by FFT cross-correlation of their onset strength envelopes
+    (O(n log n), and robust to a stray noise before the first note). An
+    optional banded DTW over downsampled chroma or RMS frames then gives a
+    time-warp map between the recordings. Only a band of width 2 * radius + 1
+    around the diagonal is stored, so memory grows linearly with length
+    instead of with the n x m cost matrix.
+
+Usage:
+    offset = estimate_offset(example, student)          # AudioAnalysis objects
+    warp = dtw_warp_map(example, student, feature="chroma")
+    result = align_recordings("example.mp3", "student.wav", dtw=True)
+
+"""
+
+import numpy as np
+
+from audio_analysis import get_analysis, HOP_LENGTH
+from instrumentation import timed
+
+DTW_DOWNSAMPLE = 4   # onset/STFT frames averaged into one DTW frame
+DTW_RADIUS = 64      # band half-width in DTW frames (~6 s at 22050 Hz)
+DTW_FEATURES = ("chroma", "rms")
+
+
+def _standardize(envelope):
+    envelope = np.asarray(envelope, dtype=np.float64)
+    std = envelope.std()
+    return (envelope - envelope.mean()) / std if std > 0 else envelope - envelope.mean()
+
+
+@timed("alignment")
+def estimate_offset(example, student, max_lag_seconds=None):
+    """
+    Offset in seconds of the student recording relative to the example
+    (positive: the student starts later), plus the normalized correlation
+    at that lag (0..1) as a confidence. Both analyses must share a sample rate.
+    """
+    if example.sr != student.sr:
+        raise ValueError("Both recordings must have the same sample rate")
+
+    max_lag = None if max_lag_seconds is None else int(max_lag_seconds * example.sr / HOP_LENGTH)
+    lag, confidence = envelope_lag(example.onset_envelope(), student.onset_envelope(), max_lag=max_lag)
+    return lag * HOP_LENGTH / example.sr, confidence
+
+
+def envelope_lag(example_envelope, student_envelope, max_lag=None):
+    """
+    Lag in frames (fractional) that best aligns two onset envelopes, and the
+    normalized correlation at that lag. The student envelope may be a prefix
+    of a recording that is still in progress.
+    """
+    e = _standardize(example_envelope)
+    s = _standardize(student_envelope)
+    if len(e) == 0 or len(s) == 0:
+        raise ValueError("Recording is too short to align.")
+
+    # Full linear cross-correlation through one zero-padded FFT product
+    n = len(e) + len(s) - 1
+    n_fft = 1 << (n - 1).bit_length()
+    correlation = np.fft.irfft(np.conj(np.fft.rfft(e, n_fft)) * np.fft.rfft(s, n_fft), n_fft)
+    # correlation[k] pairs e[t] with s[t + k]; negative lags wrap to the end
+    lags = np.concatenate((np.arange(0, len(s)), np.arange(-(len(e) - 1), 0)))
+    correlation = np.concatenate((correlation[:len(s)], correlation[n_fft - (len(e) - 1):]))
+
+    if max_lag is not None:
+        correlation = np.where(np.abs(lags) <= max_lag, correlation, -np.inf)
+
+    best = int(np.argmax(correlation))
+    lag = float(lags[best])
+
+    # Parabolic interpolation for a sub-frame estimate
+    if 0 < best < len(correlation) - 1 and lags[best - 1] == lags[best] - 1 and lags[best + 1] == lags[best] + 1:
+        left, peak, right = correlation[best - 1], correlation[best], correlation[best + 1]
+        denominator = left - 2 * peak + right
+        if np.isfinite(denominator) and denominator != 0:
+            lag += 0.5 * (left - right) / denominator
+
+    norm = np.linalg.norm(e) * np.linalg.norm(s)
+    confidence = float(np.clip(correlation[best] / norm, 0, 1)) if norm > 0 else 0.0
+    return lag, confidence
+
+
+def _dtw_frames(analysis, feature, downsample):
+    if feature == "chroma":
+        frames = analysis.chroma()
+    elif feature == "rms":
+        frames = analysis.rms()[np.newaxis, :]
+    else:
+        raise ValueError(f"Unknown DTW feature: {feature}")
+
+    # Average blocks of `downsample` frames
+    n = frames.shape[1] // downsample * downsample
+    frames = frames[:, :n].reshape(frames.shape[0], -1, downsample).mean(axis=2).T
+    if feature == "chroma":
+        norms = np.linalg.norm(frames, axis=1, keepdims=True)
+        frames = frames / np.maximum(norms, 1e-10)
+    return frames
+
+
+@timed("dtw")
+def banded_dtw(x, y, radius=DTW_RADIUS):
+    """
+    DTW between frame sequences x (n, d) and y (m, d) restricted to a band
+    of +-radius frames around the straight line from (0, 0) to (n-1, m-1).
+    Returns the warping path as an array of (i, j) pairs.
+    Cost is 1 - cosine similarity for multi-dimensional frames (rows are
+    expected to be unit length) and the absolute difference for 1-d frames.
+    """
+    n, m = len(x), len(y)
+    if n == 0 or m == 0:
+        raise ValueError("Cannot align an empty sequence.")
+    # The band must be wide enough for every row to reach its neighbours
+    radius = max(int(radius), int(np.ceil(m / n)) + 1)
+    width = 2 * radius + 1
+
+    starts = np.clip(np.round(np.arange(n) * (m - 1) / max(n - 1, 1)).astype(int) - radius, 0, max(m - width, 0))
+    cost = np.full((n, width), np.inf)
+    steps = np.zeros((n, width), dtype=np.int8)  # 0 diagonal, 1 from above, 2 from the left
+
+    for i in range(n):
+        j0 = starts[i]
+        j = np.arange(j0, min(j0 + width, m))
+        if x.shape[1] == 1:
+            local = np.abs(y[j, 0] - x[i, 0])
+        else:
+            local = 1.0 - y[j] @ x[i]
+
+        if i == 0:
+            diagonal = np.full(len(j), np.inf)
+            above = np.full(len(j), np.inf)
+            diagonal[0] = 0.0 if j0 == 0 else np.inf
+        else:
+            previous, p0 = cost[i - 1], starts[i - 1]
+            diagonal = _band_lookup(previous, p0, j - 1)
+            above = _band_lookup(previous, p0, j)
+
+        # Best way into each cell from the previous row, then a min-plus scan
+        # along the row for horizontal moves: D[j] = C[j] + min_{k<=j}(a[k] - C[k-1])
+        from_previous = np.minimum(diagonal, above)
+        cumulative = np.cumsum(local)
+        candidates = from_previous - (cumulative - local)
+        best = np.minimum.accumulate(candidates)
+        cost[i, :len(j)] = cumulative + best
+        steps[i, :len(j)] = np.where(best < candidates, 2, np.where(above < diagonal, 1, 0))
+
+    # Backtrack from the last cell
+    i, j = n - 1, m - 1
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        step = steps[i, j - starts[i]]
+        if step == 2:
+            j -= 1
+        elif step == 1:
+            i -= 1
+        else:
+            i, j = i - 1, j - 1
+        path.append((i, j))
+    return np.array(path[::-1])
+
+
+def _band_lookup(row, start, j):
+    # Values of a stored band row at absolute columns j (inf outside the band)
+    index = j - start
+    valid = (index >= 0) & (index < len(row))
+    values = np.full(len(j), np.inf)
+    values[valid] = row[index[valid]]
+    return values
+
+
+def dtw_warp_map(example, student, feature="chroma", downsample=DTW_DOWNSAMPLE, radius=DTW_RADIUS):
+    """
+    Time-warp map between two analyses at the same sample rate.
+    Returns {"example_times", "student_times"}: matching times in seconds.
+    """
+    x = _dtw_frames(example, feature, downsample)
+    y = _dtw_frames(student, feature, downsample)
+    path = banded_dtw(x, y, radius=radius)
+    seconds_per_frame = downsample * HOP_LENGTH / example.sr
+    return {
+        "example_times": path[:, 0] * seconds_per_frame,
+        "student_times": path[:, 1] * seconds_per_frame,
+    }
+
+
+def align_recordings(example_path, student_path, dtw=False, feature="chroma", max_lag_seconds=None):
+    """
+    Align a student recording to the example.
+    Returns {"offset", "confidence"} and, with dtw=True, the warp map of the
+    offset-corrected student recording ("example_times"/"student_times",
+    student times already shifted back by the offset).
+    """
+    example = get_analysis(example_path)
+    student = get_analysis(student_path, sr=example.sr)
+    offset, confidence = estimate_offset(example, student, max_lag_seconds=max_lag_seconds)
+    result = {"offset": offset, "confidence": confidence}
+
+    if dtw:
+        # Warp the offset-corrected student so the band stays around the diagonal
+        shift = int(round(offset * student.sr))
+        if shift >= 0:
+            y = student.y[shift:]
+        else:
+            y = np.concatenate((np.zeros(-shift, dtype=student.y.dtype), student.y))
+        shifted = type(student)(y, student.sr)
+        warp = dtw_warp_map(example, shifted, feature=feature)
+        result["example_times"] = warp["example_times"]
+        result["student_times"] = warp["student_times"] + offset
+
+    return result
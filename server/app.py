@@ -1,14 +1,53 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
+from flask_sock import Sock
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import os
-from waveform import generate_waveform
-from youtube_to_mp3 import download_youtube_audio
-from generate_advice import gen
-from scorepiece import use_trained_model
+import json
+import time
+import numpy as np
+from waveform_transport import encode_dynamics, BINARY_MIMETYPE, DEFAULT_ENCODING
+from feature_cache import default_cache
+from comparison import compare_concurrently, StageTimeoutError
+from jobs import JobRunner, MemoryJobStore, SQLiteJobStore, QueueFullError
+from workspace import workspaces
+from reference_library import ReferenceLibrary, link_or_copy
+from audio_delivery import send_audio, default_renditions
+from instrumentation import default_metrics, start_trace, end_trace, server_timing, max_rss_mb, current_rss_mb
+from startup import (lazy_import, run_analysis, submit_analysis, start_analysis_pool,
+                     start_background_warm_up, STARTUP_MODE, WARMUP)
+
+# Analysis modules pull in librosa, scipy, sklearn, yt_dlp and google.genai.
+# With TUNESYNC_STARTUP=lazy each is only imported by the first request that uses it.
+waveform = lazy_import('waveform')
+waveform_pyramid = lazy_import('waveform_pyramid')
+youtube_to_mp3 = lazy_import('youtube_to_mp3')
+scorepiece = lazy_import('scorepiece')
+model_registry = lazy_import('model_registry')
+match = lazy_import('match')
+generate_advice = lazy_import('generate_advice')
+live = lazy_import('live')
+audio_analysis = lazy_import('audio_analysis')
+ingest = lazy_import('ingest')
+
+# Under the debug reloader, `python app.py` first runs a parent that only
+# watches files; workers and warm-up belong to the child that serves
+reloader_parent = __name__ == '__main__' and 'WERKZEUG_RUN_MAIN' not in os.environ
+
+# Forked before any thread exists; workers import and warm up on their own
+analysis_pool = None if reloader_parent else start_analysis_pool()
 
 app = Flask(__name__)
-CORS(app)
+# Binary waveform responses describe their layout in headers the client must be able to read
+CORS(app, expose_headers=[
+    'X-Waveform-Encoding', 'X-Waveform-Count', 'X-Waveform-Sr', 'X-Waveform-Hop-Length',
+    'X-Waveform-Start', 'X-Waveform-Scale', 'X-Waveform-Offset', 'X-Audio-File-Url', 'X-Waveform-Url', 'X-Session-Id',
+    'Server-Timing'
+])
+
+# WebSocket endpoints (live recording)
+sock = Sock(app)
 
 app.config['AUDIO_FOLDER'] = 'audio_files'
 os.makedirs(app.config['AUDIO_FOLDER'], exist_ok=True)
@@ -16,6 +55,111 @@ os.makedirs(app.config['AUDIO_FOLDER'], exist_ok=True)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Let a front proxy (nginx X-Accel, Apache mod_xsendfile) send audio files itself
+app.config['USE_X_SENDFILE'] = os.environ.get('TUNESYNC_X_SENDFILE') == '1'
+
+# Slow stages are looked up here so they can be swapped for stubs locally
+# (None: youtube_to_mp3.download_youtube_source and generate_advice.gen)
+app.config['DOWNLOADER'] = None
+app.config['ADVICE_GENERATOR'] = None
+
+# Every request is timed per endpoint (see /metrics). Requests with an X-Trace
+# header, or all of them with TUNESYNC_TRACE_REQUESTS=1, also get a
+# Server-Timing header listing the stages they ran
+app.config['TRACE_REQUESTS'] = os.environ.get('TUNESYNC_TRACE_REQUESTS') == '1'
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.request_peak_rss = max_rss_mb()
+    traced = app.config['TRACE_REQUESTS'] or request.headers.get('X-Trace')
+    g.trace_token = start_trace() if traced else None
+
+@app.after_request
+def finish_request_metrics(response):
+    seconds = time.perf_counter() - g.request_start
+    default_metrics.record(f"request:{request.endpoint}", seconds, error=response.status_code >= 500,
+                           rss_mb=current_rss_mb(), peak_growth_mb=max_rss_mb() - g.request_peak_rss)
+    if g.get('trace_token') is not None:
+        timing = server_timing(end_trace(g.trace_token))
+        g.trace_token = None
+        response.headers['Server-Timing'] = (timing + ', ' if timing else '') + f'total;dur={seconds * 1000:.1f}'
+    return response
+
+# Background jobs for ?async=1 requests; set TUNESYNC_JOB_DB to share them across processes
+job_db = os.environ.get('TUNESYNC_JOB_DB')
+job_runner = JobRunner(SQLiteJobStore(job_db) if job_db else MemoryJobStore())
+
+# Load the scoring model once at startup so requests never pay for it
+# (lazy startup: on first use, or by the background warm-up)
+if STARTUP_MODE != 'lazy':
+    model_registry.default_registry.load()
+
+# Per-session storage; idle sessions are removed in the background
+workspaces.start_cleanup()
+
+# YouTube references are downloaded once per video/clip and shared across sessions
+def download_reference(*args, **kwargs):
+    downloader = app.config['DOWNLOADER'] or youtube_to_mp3.download_youtube_source
+    return downloader(*args, **kwargs)
+
+reference_library = ReferenceLibrary(downloader=download_reference)
+
+# Import the analysis stack and compile its kernels before the first request
+# (the workers compile their own; the server then only needs the imports)
+if WARMUP and not reloader_parent:
+    start_background_warm_up(run_clip=analysis_pool is None)
+
+def request_session_id():
+    # Taken from the query string, form fields or JSON body, whichever has it
+    body = request.get_json(silent=True) or {}
+    return request.args.get('session_id') or request.form.get('session_id') or body.get('session_id')
+
+def session_urls(session, filename):
+    base = f"http://127.0.0.1:5000/sessions/{session.id}"
+    return f"{base}/files/{filename}", f"{base}/waveform/{filename}"
+
+def wants_async():
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def job_accepted(kind, fn):
+    try:
+        job_id = job_runner.submit(kind, fn)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"http://127.0.0.1:5000/jobs/{job_id}",
+        "events_url": f"http://127.0.0.1:5000/jobs/{job_id}/events"
+    }), 202
+
+def waveform_response(file_path, audio_file_url, waveform_url, session_id=None):
+    # Clients that Accept application/octet-stream get a packed dynamics buffer
+    # (?encoding=float32|uint16|uint8); everyone else keeps the JSON lists.
+    # The dynamics are computed (and cached) first, so the pyramid is built from the cache.
+    if request.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE:
+        data = run_analysis('waveform.compute_dynamics', file_path)
+        waveform_pyramid.get_pyramid(file_path)
+        try:
+            body, headers = encode_dynamics(
+                data["dynamics"], data["sr"], waveform.HOP_LENGTH,
+                encoding=request.args.get('encoding', DEFAULT_ENCODING)
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        headers['X-Audio-File-Url'] = audio_file_url
+        headers['X-Waveform-Url'] = waveform_url
+        if session_id:
+            headers['X-Session-Id'] = session_id
+        return Response(body, mimetype=BINARY_MIMETYPE, headers=headers)
+
+    waveform_data = run_analysis('waveform.generate_waveform', file_path)
+    waveform_pyramid.get_pyramid(file_path)
+    response_data = {"waveform_data": waveform_data, "audio_file_url": audio_file_url, "waveform_url": waveform_url}
+    if session_id:
+        response_data["session_id"] = session_id
+    return jsonify(response_data)
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -28,15 +172,25 @@ def upload_file():
 
     # Secure and save the uploaded file
     filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
+    session_id = request_session_id()
 
-    # Generate waveform data
-    waveform_data = generate_waveform(file_path)
+    if session_id:
+        # Store the recording in the caller's own session directory
+        session = workspaces.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Unknown or expired session'}), 404
+        file_path = session.file_path('recording', os.path.splitext(filename)[1] or '.wav')
+        file.save(file_path)
+        session.set_file('recording', file_path)
+        audio_file_url, waveform_url = session_urls(session, os.path.basename(file_path))
+    else:
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file.save(file_path)
+        audio_file_url = f"http://127.0.0.1:5000/uploads/{filename}"
+        waveform_url = f"http://127.0.0.1:5000/waveform/uploads/{filename}"
 
-    audio_file_url = f"http://127.0.0.1:5000/uploads/{filename}"
-
-    return jsonify({"waveform_data": waveform_data, "audio_file_url": audio_file_url})
+    # Generate waveform data
+    return waveform_response(file_path, audio_file_url, waveform_url, session_id=session_id)
 
 @app.route('/process_youtube', methods=['POST'])
 def process_youtube():
@@ -45,34 +199,356 @@ def process_youtube():
     if not youtube_url:
         return jsonify({"error": "No YouTube URL provided"}), 400
 
+    # Each reference goes into its own session (a new one unless the client sends its ID)
+    session_id = request_session_id()
+    session = workspaces.get(session_id) if session_id else workspaces.create()
+    if session is None:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    # Played as MP3 (encoded on first request); the waveform is read from the PCM
+    audio_file_url, _ = session_urls(session, "reference.mp3")
+    _, waveform_url = session_urls(session, audio_analysis.pcm_filename('reference'))
+
+    def download():
+        # Link the shared library copy into the session (no second download or copy).
+        # Analysis reads the PCM; the MP3 is only encoded when it is played.
+        entry = reference_library.get(youtube_url)
+        output_path = link_or_copy(entry.pcm_path, os.path.join(session.directory, audio_analysis.pcm_filename('reference')))
+        source_extension = os.path.splitext(entry.source_path)[1]
+        source_path = link_or_copy(entry.source_path, session.file_path('reference_source', source_extension))
+        session.set_file('reference', output_path)
+        session.set_file('reference_source', source_path)
+        session.set_value('reference_key', entry.key)
+        return output_path
+
+    if wants_async():
+        def run(report):
+            report('download')
+            output_path = download()
+            if not output_path:
+                raise RuntimeError("Error downloading audio")
+            report('waveform')
+            waveform_data = run_analysis('waveform.generate_waveform', output_path)
+            waveform_pyramid.get_pyramid(output_path)
+            return {"waveform_data": waveform_data, "audio_file_url": audio_file_url,
+                    "waveform_url": waveform_url, "session_id": session.id}
+        return job_accepted('process_youtube', run)
+
     # Download the audio from YouTube
     try:
-        output_path = download_youtube_audio(youtube_url, "downloaded_audio.mp3")
+        output_path = download()
     except Exception as e:
         return jsonify({"error": f"Error downloading audio: {str(e)}"}), 500
 
     if not output_path:
         return jsonify({"error": "Error downloading audio"}), 500
-    
+
     # Generate waveform data from the downloaded audio
-    waveform_data = generate_waveform(output_path)
+    return waveform_response(output_path, audio_file_url, waveform_url, session_id=session.id)
+
+@app.route('/waveform/<folder>/<path:filename>', methods=['GET'])
+def waveform_range(folder, filename):
+    # Return min/max/mean dynamics for ?start=&end= seconds at ?width= pixels
+    folders = {'audio_files': app.config['AUDIO_FOLDER'], 'uploads': app.config['UPLOAD_FOLDER']}
+    if folder not in folders:
+        return jsonify({"error": f"Unknown folder: {folder}"}), 404
 
-    audio_file_url = f"http://127.0.0.1:5000/audio_files/downloaded_audio.mp3"
+    file_path = os.path.join(folders[folder], secure_filename(filename))
+    if not os.path.exists(file_path):
+        return jsonify({"error": "Audio file not found"}), 404
 
-    return jsonify({"waveform_data": waveform_data, "audio_file_url": audio_file_url})
+    return waveform_range_response(file_path)
+
+@app.route('/sessions/<session_id>/waveform/<filename>', methods=['GET'])
+def session_waveform_range(session_id, filename):
+    session = workspaces.get(session_id)
+    if session is None or not session.contains(filename):
+        return jsonify({"error": "Audio file not found"}), 404
+    return waveform_range_response(os.path.join(session.directory, filename))
+
+def waveform_range_response(file_path):
+    try:
+        start = request.args.get('start', 0.0, type=float)
+        end = request.args.get('end', None, type=float)
+        width = request.args.get('width', 800, type=int)
+    except ValueError:
+        return jsonify({"error": "Invalid range parameters"}), 400
+
+    pyramid = waveform_pyramid.get_pyramid(file_path)
+    view = waveform_pyramid.query_pyramid(pyramid, start=start, end=end, width=width)
+    view["duration"] = pyramid["duration"]
+    return jsonify(view)
 
 @app.route('/compare-audio', methods=['GET'])
 def compare_audio():
-    result = gen()
-    score = use_trained_model('./uploads/recording.wav')
-    if "error" in result:
-        return jsonify(result), 500
-    
-    return jsonify({"result": result, "score": score})
+    # Compare the files of one session; references are only stored in sessions
+    session_id = request_session_id()
+    if not session_id:
+        return jsonify({"error": "No session_id provided"}), 400
+    session = workspaces.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    reference_path, recording_path = session.get_file('reference'), session.get_file('recording')
+    if not reference_path or not recording_path:
+        return jsonify({"error": "Session needs both a reference and a recording"}), 400
+    advice_args = (reference_path, recording_path)
+
+    # Advice and scoring are independent, so they run side by side
+    def advice():
+        if app.config['ADVICE_GENERATOR']:
+            return app.config['ADVICE_GENERATOR'](*advice_args)
+        if generate_advice.ADVICE_MODE == 'local':
+            return run_analysis('generate_advice.gen', *advice_args)
+        # Gemini calls wait on the network: they stay on this thread (and this process's
+        # upload/advice caches) instead of holding an analysis worker; only the CPU part goes there
+        findings, playback_path = None, None
+        if generate_advice.ADVICE_MODE == 'gemini-full':
+            # The reference is kept as raw PCM; Gemini gets its playback MP3 instead
+            playback_path = session.get_file('reference_playback') or reference_playback(session)
+        if generate_advice.ADVICE_MODE == 'gemini':
+            try:
+                findings = run_analysis('discrepancies.detect_discrepancies', *advice_args)
+            except Exception as e:
+                return {"error": str(e)}
+        return generate_advice.gen(*advice_args, reference_playback=playback_path, findings=findings)
+
+    def score():
+        return run_analysis('scorepiece.use_trained_model', recording_path)
+
+    if wants_async():
+        def run(report):
+            comparison = compare_concurrently(advice, score, report=report)
+            if comparison.get("advice_error") and not comparison["advice_timed_out"]:
+                raise RuntimeError(comparison["advice_error"])
+            return comparison
+        return job_accepted('compare_audio', run)
+
+    try:
+        comparison = compare_concurrently(advice, score)
+    except StageTimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+
+    if comparison.get("advice_error") and not comparison["advice_timed_out"]:
+        return jsonify({"error": comparison["advice_error"]}), 500
+
+    # Slow advice: answer with the score now (result is None, partial is true)
+    return jsonify(comparison)
+
+# Upper bound on recordings per /score-batch request
+MAX_BATCH_FILES = 100
+
+@app.route('/score-batch', methods=['POST'])
+def score_batch():
+    # Score many takes at once (multipart "files" fields); they are stored in a session
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files in request'}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({'error': f'At most {MAX_BATCH_FILES} files per batch'}), 413
+
+    session_id = request_session_id()
+    session = workspaces.get(session_id) if session_id else workspaces.create()
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+
+    filenames, paths = [], []
+    for i, file in enumerate(files):
+        filename = secure_filename(file.filename)
+        role = f'batch{i:03d}'
+        file_path = session.file_path(role, os.path.splitext(filename)[1] or '.wav')
+        file.save(file_path)
+        session.set_file(role, file_path)
+        filenames.append(filename)
+        paths.append(file_path)
+
+    def score():
+        # One feature extraction per file on the warm analysis workers, then one matrix call
+        rows = []
+        for path, future in [(path, submit_analysis('scorepiece.extract_feature_row', path)) for path in paths]:
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                print(f"Error processing {path}: {str(e)}")
+                rows.append(None)
+        results = []
+        for filename, metrics in zip(filenames, run_analysis('scorepiece.score_feature_rows', rows)):
+            if metrics is None:
+                results.append({'filename': filename, 'error': 'Could not extract features'})
+            else:
+                results.append({'filename': filename, **metrics})
+        return {'session_id': session.id, 'results': results}
+
+    if wants_async():
+        def run(report):
+            report('scoring')
+            return score()
+        return job_accepted('score_batch', run)
+
+    return jsonify(score())
+
+@app.route('/sessions/<session_id>/alignment', methods=['GET'])
+def session_alignment(session_id):
+    # Offset and gain for the recording; the client applies them during playback
+    session = workspaces.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    reference_path, recording_path = session.get_file('reference'), session.get_file('recording')
+    if not reference_path or not recording_path:
+        return jsonify({"error": "Session needs both a reference and a recording"}), 400
+    try:
+        return jsonify(match.alignment_parameters(reference_path, recording_path))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+
+@app.route('/sessions/<session_id>/discrepancies', methods=['GET'])
+def session_discrepancies(session_id):
+    # The locally detected discrepancies behind the advice text, as structured data
+    session = workspaces.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    reference_path, recording_path = session.get_file('reference'), session.get_file('recording')
+    if not reference_path or not recording_path:
+        return jsonify({"error": "Session needs both a reference and a recording"}), 400
+    try:
+        report = run_analysis('discrepancies.discrepancy_report', reference_path, recording_path,
+                              count=request.args.get('count', type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+    return jsonify(report)
+
+# Accepted ?sr= of live takes (Hz)
+LIVE_SAMPLE_RATES = (8000, 192000)
+
+@sock.route('/sessions/<session_id>/live')
+def live_recording(ws, session_id):
+    # Binary messages are mono float32 PCM chunks at ?sr=; the text message
+    # {"type": "stop"} ends the take. Dynamics, onsets and alignment come back
+    # as JSON messages while recording, then a "done" message with the waveform.
+    session = workspaces.get(session_id)
+    if session is None:
+        ws.send(json.dumps({"type": "error", "error": "Unknown or expired session"}))
+        return
+    sr = request.args.get('sr', 44100, type=int)
+    if not LIVE_SAMPLE_RATES[0] <= sr <= LIVE_SAMPLE_RATES[1]:
+        ws.send(json.dumps({"type": "error",
+                            "error": f"sr must be between {LIVE_SAMPLE_RATES[0]} and {LIVE_SAMPLE_RATES[1]} Hz"}))
+        return
+
+    recording_path = session.file_path('recording', '.wav')
+    try:
+        take = live.LiveTake(sr, reference_path=session.get_file('reference'), output_path=recording_path)
+    except Exception as e:
+        ws.send(json.dumps({"type": "error", "error": str(e)}))
+        return
+    try:
+        while True:
+            message = ws.receive()
+            if isinstance(message, (bytes, bytearray)):
+                for update in take.push(np.frombuffer(message, dtype='<f4')):
+                    ws.send(json.dumps(update))
+            elif message and json.loads(message).get('type') == 'stop':
+                break
+    except Exception:
+        take.abort()
+        raise
+
+    updates, summary = take.finish()
+    for update in updates:
+        ws.send(json.dumps(update))
+    session.set_file('recording', recording_path)
+
+    # Dynamics were cached by the take, so this does not re-read the recording
+    audio_file_url, waveform_url = session_urls(session, os.path.basename(recording_path))
+    ws.send(json.dumps({
+        "type": "done",
+        "waveform_data": run_analysis('waveform.generate_waveform', recording_path),
+        "audio_file_url": audio_file_url,
+        "waveform_url": waveform_url,
+        "session_id": session.id,
+        **summary
+    }))
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_runner.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    # Server-sent events: one message per status/stage change until the job finishes
+    if job_runner.store.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def stream():
+        for job in job_runner.events(job_id):
+            yield f"data: {json.dumps(job)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/model', methods=['GET'])
+def model_info():
+    return jsonify(model_registry.default_registry.info())
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    stats = default_cache.stats()
+    stats["reference_library"] = reference_library.stats()
+    stats["renditions"] = default_renditions.stats()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET', 'DELETE'])
+def metrics():
+    # Per-stage latency histograms and memory; ?format=prometheus for the text format
+    if request.method == 'DELETE':
+        default_metrics.reset()
+        return jsonify({"reset": True})
+    if request.args.get('format') == 'prometheus':
+        return Response(default_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(default_metrics.snapshot())
+
+def audio_response(file_path):
+    # Range/ETag aware; ?rendition=low|standard serves a cached re-encoded MP3
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({"error": "Audio file not found"}), 404
+    try:
+        return send_audio(file_path, rendition=request.args.get('rendition'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route('/audio_files/<path:filename>', methods=['GET'])
 def serve_audio(filename):
-    return send_from_directory(app.config['AUDIO_FOLDER'], filename)
+    return audio_response(safe_join(app.config['AUDIO_FOLDER'], filename))
+
+@app.route('/uploads/<path:filename>', methods=['GET'])
+def serve_upload(filename):
+    # /upload returns these URLs for recordings uploaded without a session
+    return audio_response(safe_join(app.config['UPLOAD_FOLDER'], filename))
+
+@app.route('/sessions/<session_id>/files/<filename>', methods=['GET'])
+def serve_session_audio(session_id, filename):
+    session = workspaces.get(session_id)
+    if session is not None and filename == 'reference.mp3' and not session.contains(filename):
+        playback_path = reference_playback(session)
+        if playback_path:
+            return audio_response(playback_path)
+    if session is None or not session.contains(filename):
+        return jsonify({"error": "Audio file not found"}), 404
+    return audio_response(os.path.join(session.directory, filename))
+
+def reference_playback(session):
+    # First playback of a reference: encode the MP3 once in the library, then link it in
+    entry = reference_library.entry(session.get_value('reference_key') or '')
+    playback_path = session.file_path('reference', '.mp3')
+    if entry is not None:
+        link_or_copy(entry.mp3_path(), playback_path)
+    elif session.get_file('reference_source'):
+        # The library entry was evicted; encode from the session's own copy
+        ingest.ensure_mp3(session.get_file('reference_source'), playback_path)
+    else:
+        return None
+    session.set_file('reference_playback', playback_path)
+    return playback_path
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
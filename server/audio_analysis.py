@@ -0,0 +1,211 @@
+"""
+Module Name: audio_analysis.py
+Date: 2026-10-18
+Description:
+    Shared single-decode analysis layer. Each audio file is decoded once into an
+    AudioAnalysis object, which computes the STFT, RMS, onset envelope, MFCC and
+    spectral centroid lazily and only once. waveform.py, match.py and
+    model/model.py all read from it instead of calling librosa.load themselves.
+
+    Raw PCM files written by ingest.py ("<name>.<sr>.f32", mono little-endian
+    float32) are memory-mapped instead of decoded.
+
+Usage:
+    analysis = get_analysis(path)             # native sample rate
+    analysis = get_analysis(path, sr=22050)   # resampled once, then reused
+
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+
+from instrumentation import stage
+from startup import lazy_import
+
+# Used inside methods only, so lazy startup can import this module without librosa
+librosa = lazy_import("librosa")
+
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Sample rate downloaded references are decoded to (librosa.load default)
+ANALYSIS_SR = 22050
+PCM_EXTENSION = ".f32"
+
+# Number of decoded files kept in memory between requests
+MAX_CACHED_ANALYSES = 8
+
+
+class AudioAnalysis:
+    """
+    A decoded mono signal plus lazily computed, memoized librosa features.
+    Spectral features share one magnitude STFT and one mel spectrogram.
+    """
+
+    def __init__(self, y, sr, path=None):
+        self.y = y
+        self.sr = sr
+        self.path = path
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path, sr=None):
+        if path.endswith(PCM_EXTENSION):
+            y, native_sr = load_pcm(path)
+            return cls(y, native_sr, path=path).resampled(sr)
+        with stage("decode"):
+            y, sr = librosa.load(path, sr=sr)
+        return cls(y, sr, path=path)
+
+    def resampled(self, target_sr):
+        """Return a new analysis of the same audio at target_sr (no re-decode)."""
+        if target_sr is None or target_sr == self.sr:
+            return self
+        with stage("resample"):
+            y = librosa.resample(self.y, orig_sr=self.sr, target_sr=target_sr)
+        return AudioAnalysis(y, target_sr, path=self.path)
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key not in self._memo:
+                # Timed under the feature name (rms, onset_envelope, beat_track, piptrack, ...)
+                with stage(key[0]):
+                    self._memo[key] = compute()
+            return self._memo[key]
+
+    @property
+    def duration(self):
+        return librosa.get_duration(y=self.y, sr=self.sr)
+
+    @cached_property
+    def stft_magnitude(self):
+        with stage("stft"):
+            return np.abs(librosa.stft(self.y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+
+    @cached_property
+    def mel_power(self):
+        return librosa.feature.melspectrogram(S=self.stft_magnitude ** 2, sr=self.sr)
+
+    @cached_property
+    def mel_db(self):
+        return librosa.power_to_db(self.mel_power)
+
+    def rms(self, frame_length=N_FFT, hop_length=HOP_LENGTH):
+        # Time-domain RMS so values match librosa.feature.rms(y=...) exactly
+        return self._cached(
+            ('rms', frame_length, hop_length),
+            lambda: librosa.feature.rms(y=self.y, frame_length=frame_length, hop_length=hop_length)[0],
+        )
+
+    def onset_envelope(self, aggregate=np.mean):
+        # beat_track aggregates with np.median, onset_detect with np.mean
+        return self._cached(
+            ('onset_envelope', aggregate),
+            lambda: librosa.onset.onset_strength(S=self.mel_db, sr=self.sr, aggregate=aggregate),
+        )
+
+    def onsets(self, backtrack=True):
+        return self._cached(
+            ('onsets', backtrack),
+            lambda: librosa.onset.onset_detect(
+                onset_envelope=self.onset_envelope(), sr=self.sr, backtrack=backtrack
+            ),
+        )
+
+    def beats(self):
+        """Return (tempo, beat_frames) as librosa.beat.beat_track would."""
+        return self._cached(
+            ('beat_track',),
+            lambda: librosa.beat.beat_track(
+                onset_envelope=self.onset_envelope(aggregate=np.median), sr=self.sr
+            ),
+        )
+
+    def pitch_track(self):
+        """Return (pitches, magnitudes) as librosa.piptrack would."""
+        return self._cached(
+            ('piptrack',),
+            lambda: librosa.piptrack(S=self.stft_magnitude, sr=self.sr),
+        )
+
+    def chroma(self):
+        return self._cached(
+            ('chroma',),
+            lambda: librosa.feature.chroma_stft(S=self.stft_magnitude ** 2, sr=self.sr),
+        )
+
+    def mfcc(self, n_mfcc=13):
+        return self._cached(
+            ('mfcc', n_mfcc),
+            lambda: librosa.feature.mfcc(S=self.mel_db, sr=self.sr, n_mfcc=n_mfcc),
+        )
+
+    def spectral_centroid(self):
+        return self._cached(
+            ('spectral_centroid',),
+            lambda: librosa.feature.spectral_centroid(S=self.stft_magnitude, sr=self.sr)[0],
+        )
+
+
+def pcm_filename(name, sr=ANALYSIS_SR):
+    return f"{name}.{sr}{PCM_EXTENSION}"
+
+
+def pcm_sample_rate(path):
+    return int(os.path.basename(path)[:-len(PCM_EXTENSION)].rsplit(".", 1)[1])
+
+
+def load_pcm(path):
+    """Memory-map a "<name>.<sr>.f32" file; returns (samples, sr)."""
+    return np.memmap(path, dtype="<f4", mode="r"), pcm_sample_rate(path)
+
+
+_analyses = OrderedDict()
+_analyses_lock = threading.Lock()
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def get_analysis(path, sr=None):
+    """
+    Return the shared AudioAnalysis for path at sample rate sr (None = native).
+    The file is decoded once; other sample rates are resampled from that decode.
+    Entries are invalidated when the file changes on disk.
+    """
+    file_key = _file_key(path)
+    key = (file_key, sr)
+
+    with _analyses_lock:
+        if key in _analyses:
+            _analyses.move_to_end(key)
+            return _analyses[key]
+        native = _analyses.get((file_key, None))
+
+    if native is None:
+        native = AudioAnalysis.load(path, sr=None)
+    analysis = native.resampled(sr)
+
+    with _analyses_lock:
+        # Drop stale entries for an overwritten file at the same path
+        for stale in [k for k in _analyses if k[0][0] == file_key[0] and k[0] != file_key]:
+            del _analyses[stale]
+        _analyses[(file_key, None)] = native
+        _analyses[key] = analysis
+        _analyses.move_to_end(key)
+        while len(_analyses) > MAX_CACHED_ANALYSES:
+            _analyses.popitem(last=False)
+
+    return analysis
+
+
+def clear_analyses():
+    with _analyses_lock:
+        _analyses.clear()
@@ -0,0 +1,165 @@
+"""
+Module Name: audio_delivery.py
+Date: 2026-10-18
+Description:
+    Serves audio files for playback. Responses carry a strong ETag (the
+    SHA-256 of the file contents) and Last-Modified, answer Range requests
+    with 206 partial content, and return 304 when the client already has the
+    file, so seeking only fetches the bytes it needs and nothing is sent
+    twice. Under a WSGI server with wsgi.file_wrapper (gunicorn), full
+    responses go out through sendfile; with TUNESYNC_X_SENDFILE=1 app.py
+    hands every file to the front proxy (nginx, Apache) via X-Sendfile instead.
+
+    ?rendition=low (or standard) serves a re-encoded MP3 of the file. It is
+    encoded on first request and kept in a size-limited cache keyed by the
+    content hash, so long WAV takes and references stay cheap to scrub
+    through.
+
+Usage:
+    return send_audio(path, rendition=request.args.get("rendition"))
+    print(default_renditions.stats())
+
+"""
+
+import mimetypes
+import os
+import threading
+import time
+
+from flask import send_file
+
+from audio_analysis import PCM_EXTENSION
+from feature_cache import file_hash
+from startup import lazy_import
+
+ingest = lazy_import("ingest")
+
+RENDITION_DIR = os.environ.get("TUNESYNC_RENDITION_DIR", "renditions")
+MAX_RENDITION_BYTES = int(os.environ.get("TUNESYNC_RENDITION_BYTES", 512 * 1024 * 1024))
+
+# name -> (MP3 bitrate, channels; None keeps the source layout)
+RENDITIONS = {
+    "low": ("64k", 1),
+    "standard": ("192k", None),  # same as ingest.PLAYBACK_BITRATE
+}
+
+mimetypes.add_type("audio/mpeg", ".mp3")
+mimetypes.add_type("audio/wav", ".wav")
+mimetypes.add_type("audio/webm", ".webm")
+mimetypes.add_type("audio/mp4", ".m4a")
+
+
+class RenditionCache:
+    """
+    Directory of encoded renditions with an LRU size limit, like FeatureCache.
+    Hits are recorded in memory rather than by touching the file, so a
+    rendition's mtime (Last-Modified) stays the time it was encoded; files
+    not used since the server started fall back to their mtime.
+    """
+
+    def __init__(self, directory=RENDITION_DIR, max_bytes=MAX_RENDITION_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._last_used = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, source_path, name):
+        """Path of rendition name of source_path, encoding it on first use."""
+        if name not in RENDITIONS:
+            raise ValueError(f"Unknown rendition: {name} (use one of {', '.join(RENDITIONS)})")
+        bitrate, channels = RENDITIONS[name]
+        layout = f"-{channels}ch" if channels else ""
+        path = os.path.join(self.directory, f"{file_hash(source_path)}-{bitrate}{layout}.mp3")
+
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+                self._last_used[os.path.basename(path)] = time.time_ns()
+            return path
+
+        with self._lock:
+            self.misses += 1
+        ingest.ensure_mp3(source_path, path, bitrate=bitrate, channels=channels)
+        with self._lock:
+            self._last_used[os.path.basename(path)] = time.time_ns()
+        self.evict(keep=path)
+        return path
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp3") or ".tmp" in name:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            with self._lock:
+                last_used = max(stat.st_mtime_ns, self._last_used.get(name, 0))
+            entries.append((last_used, stat.st_size, name))
+        return entries
+
+    def evict(self, keep=None):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            path = os.path.join(self.directory, name)
+            if keep and os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+                self._last_used.pop(name, None)
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "files": len(entries),
+                "size_bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+
+default_renditions = RenditionCache()
+
+
+def audio_mimetype(path):
+    if path.endswith(PCM_EXTENSION):
+        return "application/octet-stream"
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def send_audio(path, rendition=None, renditions=None):
+    """
+    Response for an audio file (or one of its renditions) with a content-hash
+    ETag, Last-Modified and Range support. Raises ValueError for an unknown
+    rendition.
+    """
+    if rendition:
+        path = (renditions or default_renditions).path(path, rendition)
+        # The file name is already the source hash plus the encoding; no need to hash the MP3
+        etag = os.path.splitext(os.path.basename(path))[0]
+    else:
+        etag = file_hash(path)
+    # Browsers revalidate every time (Cache-Control: no-cache); unchanged files cost a 304
+    return send_file(
+        os.path.abspath(path),
+        mimetype=audio_mimetype(path),
+        conditional=True,
+        etag=etag,
+        last_modified=os.stat(path).st_mtime,
+    )
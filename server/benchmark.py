@@ -0,0 +1,285 @@
+"""
+Module Name: benchmark.py
+Date: 2026-10-18
+Description:
+    Offline benchmark for the analysis hot paths: generate_waveform,
+    extract_performance_features, process_student_audio and
+    PerformanceScorer.score_performance. A synthetic corpus (note sequences,
+    chirps and noise bursts) is generated deterministically at the requested
+    durations and sample rates. Each stage runs cold (empty feature cache,
+    nothing decoded yet, after a short warm-up run) in a fresh process, which
+    reports wall time, peak RSS and throughput (seconds of audio per second).
+    Results are written to JSON, and --compare checks them against a baseline
+    file.
+
+Usage:
+    python benchmark.py                                  # 10 s .. 30 min
+    python benchmark.py --durations 10 60 --repeats 3 --output results.json
+    python benchmark.py --quick --compare baseline.json  # exits 1 on regressions
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from instrumentation import max_rss_mb  # 0 where resource is unavailable (Windows)
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DURATIONS = [10, 60, 300, 1800]  # seconds of audio
+QUICK_DURATIONS = [10, 60]
+SAMPLE_RATES = [22050]
+SIGNALS = ["tones", "chirp", "noise"]
+STAGES = ["waveform", "features", "align", "score"]
+REPEATS = 1
+SEED = 1234
+
+# Regressions: slower or larger than the baseline by more than this fraction
+TIME_TOLERANCE = 0.25
+RSS_TOLERANCE = 0.25
+
+GENERATE_BLOCK_SECONDS = 10
+
+
+def _tones_block(rng, sr, n):
+    # A "performance": notes of random pitch and length with attack/decay envelopes
+    y = np.zeros(n, dtype=np.float32)
+    position = 0
+    while position < n:
+        length = min(int(rng.uniform(0.15, 0.8) * sr), n - position)
+        t = np.arange(length) / sr
+        frequency = 440.0 * 2 ** (rng.integers(-24, 13) / 12)
+        note = np.sin(2 * np.pi * frequency * t) + 0.3 * np.sin(4 * np.pi * frequency * t)
+        envelope = np.minimum(1.0, t / 0.02) * np.exp(-3.0 * t)
+        y[position:position + length] = rng.uniform(0.1, 0.5) * note * envelope
+        position += length
+    return y
+
+
+def _chirp_block(rng, sr, n, start):
+    # Exponential sweeps of 5 s from 100 Hz to 4 kHz, repeated
+    t = (start + np.arange(n)) / sr % 5.0
+    phase = 2 * np.pi * 100.0 * 5.0 / np.log(40.0) * (40.0 ** (t / 5.0) - 1)
+    return (0.4 * np.sin(phase)).astype(np.float32)
+
+
+def _noise_block(rng, sr, n):
+    # Bursts of noise with sharp onsets and varying level
+    y = rng.standard_normal(n).astype(np.float32)
+    hop = int(0.25 * sr)
+    levels = np.repeat(rng.uniform(0.0, 0.3, n // hop + 1), hop)[:n]
+    decay = np.tile(np.exp(-8.0 * np.arange(hop) / sr), n // hop + 1)[:n]
+    return y * (levels * decay).astype(np.float32)
+
+
+def generate_signal(path, signal, duration, sr, seed=SEED, delay=0.0, gain=1.0):
+    """
+    Write a synthetic mono 16-bit WAV, block by block. delay prepends
+    silence and gain scales it, to make a "student" take of the same signal.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration * sr)
+    block = GENERATE_BLOCK_SECONDS * sr
+    with sf.SoundFile(path, mode="w", samplerate=sr, channels=1, subtype="PCM_16") as f:
+        f.write(np.zeros(int(delay * sr), dtype=np.float32))
+        for start in range(0, total, block):
+            n = min(block, total - start)
+            if signal == "tones":
+                y = _tones_block(rng, sr, n)
+            elif signal == "chirp":
+                y = _chirp_block(rng, sr, n, start)
+            elif signal == "noise":
+                y = _noise_block(rng, sr, n)
+            else:
+                raise ValueError(f"Unknown signal: {signal}")
+            f.write(np.clip(y * gain, -1.0, 1.0))
+    return path
+
+
+def _run_stage(stage, reference_path, student_path, output_dir, queue):
+    """Child process: run one stage once, cold, and report its cost."""
+    try:
+        sys.path.insert(0, SERVER_DIR)
+        from audio_analysis import clear_analyses
+        from waveform import generate_waveform
+        from model.model import PerformanceScorer, TRAINED_MODEL_DIR, extract_performance_features
+        from match import process_student_audio
+
+        if stage == "score":
+            scorer = PerformanceScorer.load(TRAINED_MODEL_DIR)
+            run = lambda reference, student: scorer.score_performance(reference)
+        elif stage == "waveform":
+            run = lambda reference, student: generate_waveform(reference)
+        elif stage == "features":
+            run = lambda reference, student: extract_performance_features(reference)
+        elif stage == "align":
+            output_path = os.path.join(output_dir, f"aligned-{os.getpid()}.wav")
+            run = lambda reference, student: process_student_audio(reference, student, output_path, return_audio=False)
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+
+        # Warm up on a short clip first so one-time costs (numba compilation,
+        # lazy imports, FFT plans) are not counted, then drop what it cached
+        sr = sf.info(reference_path).samplerate
+        warmup_path = os.path.join(output_dir, f"warmup-{os.getpid()}.wav")
+        generate_signal(warmup_path, "tones", 2, sr, seed=SEED + 1)
+        run(warmup_path, warmup_path)
+        os.remove(warmup_path)
+        clear_analyses()
+        cache_dir = os.environ["TUNESYNC_FEATURE_CACHE_DIR"]
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.makedirs(cache_dir)
+
+        baseline_rss = max_rss_mb()
+        start = time.perf_counter()
+        run(reference_path, student_path)
+        seconds = time.perf_counter() - start
+        queue.put({"seconds": seconds, "peak_rss_mb": max_rss_mb(), "baseline_rss_mb": baseline_rss})
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def measure(stage, reference_path, student_path, work_dir):
+    # A fresh process per measurement: nothing decoded or cached, and its own peak RSS
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, reference_path, student_path, work_dir, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import librosa
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def run_benchmarks(durations, sample_rates, signals, stages, repeats, work_dir):
+    results = []
+    for sr in sample_rates:
+        for duration in durations:
+            for signal in signals:
+                reference_path = generate_signal(
+                    os.path.join(work_dir, f"{signal}-{duration}s-{sr}.wav"), signal, duration, sr
+                )
+                student_path = generate_signal(
+                    os.path.join(work_dir, f"{signal}-{duration}s-{sr}-student.wav"), signal, duration, sr,
+                    delay=0.75, gain=0.6
+                )
+                for stage in stages:
+                    runs = [measure(stage, reference_path, student_path, work_dir) for _ in range(repeats)]
+                    errors = [run["error"] for run in runs if "error" in run]
+                    entry = {"stage": stage, "signal": signal, "duration": duration, "sr": sr}
+                    if errors:
+                        entry["error"] = errors[0]
+                        print(f"{stage:9s} {signal:6s} {duration:>5}s @ {sr}: {errors[0]}")
+                    else:
+                        seconds = statistics.median(run["seconds"] for run in runs)
+                        entry.update({
+                            "wall_seconds": round(seconds, 4),
+                            "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+                            "baseline_rss_mb": round(min(run["baseline_rss_mb"] for run in runs), 1),
+                            "throughput": round(duration / seconds, 2) if seconds > 0 else None,
+                        })
+                        print(f"{stage:9s} {signal:6s} {duration:>5}s @ {sr}: {seconds:8.3f}s  "
+                              f"peak {entry['peak_rss_mb']:7.1f} MB  {entry['throughput']:8.1f}x realtime")
+                    results.append(entry)
+                os.remove(reference_path)
+                os.remove(student_path)
+    return results
+
+
+def _key(entry):
+    return (entry["stage"], entry["signal"], entry["duration"], entry["sr"])
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, rss_tolerance=RSS_TOLERANCE):
+    """Return a list of regression messages (empty when everything is within tolerance)."""
+    baseline_by_key = {_key(entry): entry for entry in baseline["results"] if "error" not in entry}
+    regressions = []
+    for entry in results:
+        old = baseline_by_key.get(_key(entry))
+        if old is None:
+            continue
+        name = "{} {} {}s @ {}".format(*_key(entry))
+        if "error" in entry:
+            regressions.append(f"{name}: failed ({entry['error']})")
+            continue
+        if entry["wall_seconds"] > old["wall_seconds"] * (1 + time_tolerance):
+            regressions.append(f"{name}: {entry['wall_seconds']:.3f}s vs {old['wall_seconds']:.3f}s")
+        # Compare memory above the interpreter baseline so import overhead does not dominate
+        used, old_used = entry["peak_rss_mb"] - entry["baseline_rss_mb"], old["peak_rss_mb"] - old["baseline_rss_mb"]
+        if used > max(old_used, 1.0) * (1 + rss_tolerance):
+            regressions.append(f"{name}: {used:.1f} MB vs {old_used:.1f} MB above baseline RSS")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TuneSync analysis stages on synthetic audio.")
+    parser.add_argument("--durations", type=float, nargs="+", default=None, help="seconds of audio per file")
+    parser.add_argument("--quick", action="store_true", help=f"only {QUICK_DURATIONS} seconds")
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=SAMPLE_RATES)
+    parser.add_argument("--signals", nargs="+", default=SIGNALS, choices=SIGNALS)
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="runs per measurement (median is kept)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file to check for regressions")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--rss-tolerance", type=float, default=RSS_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    durations = args.durations or (QUICK_DURATIONS if args.quick else DURATIONS)
+    durations = [int(d) if float(d).is_integer() else d for d in durations]
+
+    work_dir = tempfile.mkdtemp(prefix="tunesync-bench-")
+    # Never read or pollute the server's own feature cache
+    os.environ["TUNESYNC_FEATURE_CACHE_DIR"] = os.path.join(work_dir, "feature_cache")
+    try:
+        results = run_benchmarks(durations, args.sample_rates, args.signals, args.stages, args.repeats, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"created_at": time.time(), "environment": _environment(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.time_tolerance, args.rss_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
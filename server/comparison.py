@@ -0,0 +1,72 @@
+"""
+Module Name: comparison.py
+Date: 2026-10-18
+Description:
+    Runs the two independent halves of /compare-audio at the same time: the
+    network-bound Gemini advice call and the CPU-bound feature extraction and
+    model scoring. Each stage has its own timeout. If the advice is still
+    pending when the score is ready and its timeout expires, the score is
+    returned on its own and the result is flagged as partial.
+
+Usage:
+    result = compare_concurrently(lambda: gen(reference, recording), lambda: use_trained_model(recording))
+
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from instrumentation import run_in_context
+
+ADVICE_TIMEOUT = 45  # seconds; after this the score is returned without advice
+SCORE_TIMEOUT = 120  # seconds; the score is required, so this is a hard failure
+
+# Long-lived pool so a slow advice call can finish in the background
+_stage_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="compare")
+
+
+class StageTimeoutError(Exception):
+    pass
+
+
+def compare_concurrently(advice_fn, score_fn, advice_timeout=ADVICE_TIMEOUT, score_timeout=SCORE_TIMEOUT,
+                         report=None):
+    """
+    Run advice_fn and score_fn concurrently.
+    Returns {"result": advice or None, "score": score, "partial": bool} and,
+    when the advice failed or timed out, an "advice_error" message
+    ("advice_timed_out" tells the two apart).
+    Exceptions from score_fn propagate; a score timeout raises StageTimeoutError.
+    """
+    report = report or (lambda stage: None)
+    report('advice+scoring')
+
+    start = time.monotonic()
+    # Run in the caller's context so both stages show up in its request trace
+    advice_future = _stage_pool.submit(run_in_context(advice_fn))
+    score_future = _stage_pool.submit(run_in_context(score_fn))
+
+    try:
+        score = score_future.result(timeout=score_timeout)
+    except TimeoutError:
+        raise StageTimeoutError(f"Scoring took longer than {score_timeout}s")
+
+    # Both timeouts run from the start, so the advice only gets what is left
+    report('advice')
+    comparison = {"result": None, "score": score, "partial": False, "advice_timed_out": False}
+    try:
+        advice = advice_future.result(timeout=max(0.0, advice_timeout - (time.monotonic() - start)))
+    except TimeoutError:
+        comparison["partial"] = True
+        comparison["advice_timed_out"] = True
+        comparison["advice_error"] = f"Advice took longer than {advice_timeout}s"
+        return comparison
+    except Exception as e:
+        advice = {"error": str(e)}
+
+    if isinstance(advice, dict) and "error" in advice:
+        comparison["partial"] = True
+        comparison["advice_error"] = advice["error"]
+    else:
+        comparison["result"] = advice
+    return comparison
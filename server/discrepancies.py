@@ -0,0 +1,241 @@
+"""
+Module Name: discrepancies.py
+Date: 2026-10-18
+Description:
+    Local, deterministic replacement for the Gemini comparison. The recording
+    is aligned to the reference (match.alignment_parameters), both are cut
+    into windows, and every window is compared on onset timing, missed or
+    extra notes, pitch and RMS dynamics. The three worst windows are written
+    up in the same "Timestamp; Discrepancy; Suggestion;" format the client
+    already splits, so Gemini is only needed to improve the wording.
+
+    Differences too small to matter are not reported, so a close performance
+    gets fewer than DISCREPANCY_COUNT numbered entries (fewer than 9 fields),
+    and one with none gets the single sentence NO_DISCREPANCIES instead.
+
+    Per-file contours (frame RMS, frame pitch and onset times) go through the
+    feature cache, so comparing new takes against the same reference only
+    analyses the new take.
+
+Usage:
+    findings = detect_discrepancies("reference.mp3", "recording.wav")
+    text = format_advice(findings)
+    report = discrepancy_report("reference.mp3", "recording.wav")
+
+"""
+
+import numpy as np
+import librosa
+
+from audio_analysis import get_analysis, HOP_LENGTH
+from feature_cache import cached_analysis
+from instrumentation import timed
+from match import alignment_parameters
+
+WINDOW_SECONDS = 2.0    # length of the compared segments
+DISCREPANCY_COUNT = 3
+
+PITCH_BLOCK_FRAMES = 256  # STFT frames per piptrack call
+SILENCE_DB = -40          # frames this far below the loudest frame count as silent
+ONSET_MATCH_SECONDS = 0.25
+MIN_VOICED_FRACTION = 0.25
+MIN_SEVERITY = 0.5        # smaller differences are not reported at all
+
+# The whole advice text when nothing reaches MIN_SEVERITY; no timestamp, so it is not read as a finding
+NO_DISCREPANCIES = ("No noticeable differences from the reference were found, so keep practicing "
+                    "with it and try a faster tempo or a longer passage")
+
+# A difference of this size counts as severity 1.0
+TIMING_TOLERANCE = 0.05   # seconds, mean onset deviation
+RHYTHM_TOLERANCE = 0.34   # fraction of missed or extra notes
+PITCH_TOLERANCE = 30.0    # cents
+DYNAMICS_TOLERANCE = 6.0  # dB
+
+
+def performance_contour(path, sr):
+    """Frame RMS, frame pitch (Hz, 0 when unvoiced) and onset times of one file."""
+    analysis = get_analysis(path, sr=sr)
+
+    def compute():
+        rms = analysis.rms()
+        S = analysis.stft_magnitude
+        pitch = np.zeros(S.shape[1])
+        # Strongest piptrack peak per frame, a block of frames at a time
+        for start in range(0, S.shape[1], PITCH_BLOCK_FRAMES):
+            pitches, magnitudes = librosa.piptrack(S=S[:, start:start + PITCH_BLOCK_FRAMES], sr=sr)
+            strongest = magnitudes.argmax(axis=0)
+            pitch[start:start + len(strongest)] = pitches[strongest, np.arange(len(strongest))]
+        n = min(len(rms), len(pitch))
+        silent = librosa.amplitude_to_db(rms[:n], ref=np.max) < SILENCE_DB
+        pitch[:n][silent] = 0.0
+        onsets = librosa.frames_to_time(analysis.onsets(backtrack=False), sr=sr, hop_length=HOP_LENGTH)
+        return {"rms": rms[:n], "pitch": pitch[:n], "onsets": onsets}
+
+    params = {"sr": sr, "hop_length": HOP_LENGTH, "silence_db": SILENCE_DB}
+    return cached_analysis(path, "contour", params, compute)
+
+
+def _timing(reference_onsets, recording_onsets):
+    # Pair onsets that are each other's nearest neighbour (recording already on the reference timeline)
+    if len(reference_onsets) == 0 or len(recording_onsets) == 0:
+        return np.zeros(0), len(reference_onsets), len(recording_onsets)
+    distances = np.abs(recording_onsets[None, :] - reference_onsets[:, None])
+    nearest_recording = distances.argmin(axis=1)
+    nearest_reference = distances.argmin(axis=0)
+    deviations = []
+    for i, j in enumerate(nearest_recording):
+        if nearest_reference[j] == i and distances[i, j] <= ONSET_MATCH_SECONDS:
+            deviations.append(recording_onsets[j] - reference_onsets[i])
+    return np.array(deviations), len(reference_onsets) - len(deviations), len(recording_onsets) - len(deviations)
+
+
+def _compare_window(reference, recording, start, end, lag, gain, sr):
+    """Candidate findings (kind, severity, values) for one window of the reference timeline."""
+    frames = slice(*librosa.time_to_frames([start, end], sr=sr, hop_length=HOP_LENGTH))
+    lag_frames = int(round(lag * sr / HOP_LENGTH))
+    recording_frames = slice(frames.start + lag_frames, frames.stop + lag_frames)
+    if recording_frames.start < 0 or recording_frames.stop > len(recording["rms"]):
+        return []
+
+    findings = []
+    reference_rms = reference["rms"][frames]
+    recording_rms = recording["rms"][recording_frames] * gain
+    loudest = reference["rms"].max()
+    if reference_rms.mean() > loudest * 10 ** (SILENCE_DB / 20) and recording_rms.mean() > 0:
+        db = 20 * np.log10(recording_rms.mean() / reference_rms.mean())
+        findings.append(("dynamics", abs(db) / DYNAMICS_TOLERANCE, {"db": db}))
+
+    reference_pitch = reference["pitch"][frames]
+    recording_pitch = recording["pitch"][recording_frames]
+    voiced = (reference_pitch > 0) & (recording_pitch > 0)
+    if voiced.mean() >= MIN_VOICED_FRACTION:
+        cents = 1200 * np.log2(recording_pitch[voiced] / reference_pitch[voiced])
+        # Folded into one octave so piptrack octave jumps don't dominate
+        cents = np.median((cents + 600) % 1200 - 600)
+        findings.append(("pitch", abs(cents) / PITCH_TOLERANCE, {"cents": cents}))
+
+    reference_onsets = reference["onsets"][(reference["onsets"] >= start) & (reference["onsets"] < end)]
+    recording_onsets = recording["onsets"] - lag
+    recording_onsets = recording_onsets[(recording_onsets >= start - ONSET_MATCH_SECONDS)
+                                        & (recording_onsets < end + ONSET_MATCH_SECONDS)]
+    if len(reference_onsets):
+        deviations, missed, extra = _timing(reference_onsets, recording_onsets)
+        # Onsets just outside the window were only there to be matched
+        extra = max(0, extra - int(np.sum((recording_onsets < start) | (recording_onsets >= end))))
+        findings.append(("rhythm", (missed + extra) / len(reference_onsets) / RHYTHM_TOLERANCE,
+                         {"missed": missed, "extra": extra, "notes": len(reference_onsets)}))
+        if len(deviations):
+            findings.append(("timing", np.mean(np.abs(deviations)) / TIMING_TOLERANCE,
+                             {"mean": float(np.mean(deviations))}))
+    return findings
+
+
+def _sentence(text):
+    return text[0].upper() + text[1:]
+
+
+def _notes(count):
+    return f"{count} note" if count == 1 else f"{count} notes"
+
+
+def _describe(kind, values, severity):
+    # No periods inside sentences: the client splits the advice on semicolons
+    degree = "Slightly " if severity < 1 else ""
+    if kind == "dynamics":
+        louder = values["db"] > 0
+        return (_sentence(f"{degree}{'louder' if louder else 'softer'} than the reference, "
+                          f"by about {abs(values['db']):.0f} dB"),
+                f"Play {'softer' if louder else 'with more volume'} here and follow the dynamic "
+                f"shape of the reference")
+    if kind == "pitch":
+        sharp = values["cents"] > 0
+        return (_sentence(f"{degree}{'sharp' if sharp else 'flat'} compared to the reference, "
+                          f"by about {abs(values['cents']):.0f} cents"),
+                f"Check the intonation of this passage against a tuner or drone and bring the notes "
+                f"{'down' if sharp else 'up'}")
+    if kind == "timing":
+        late = values["mean"] > 0
+        return (f"Notes come in {'late' if late else 'early'} by about {abs(values['mean']) * 1000:.0f} ms "
+                f"on average compared to the reference",
+                f"Practice this passage slowly with a metronome and "
+                f"{'anticipate each note a little more' if late else 'wait for the beat before each note'}")
+    missing = []
+    if values["missed"]:
+        missing.append(f"{values['missed']} of {_notes(values['notes'])} in the reference "
+                       f"{'is' if values['missed'] == 1 else 'are'} missing")
+    if values["extra"]:
+        missing.append(f"{values['extra']} extra {'note is' if values['extra'] == 1 else 'notes are'} played")
+    return (_sentence(" and ".join(missing)) if missing else "The rhythm differs from the reference",
+            "Listen to the reference at this point and count the notes before playing it again slowly")
+
+
+@timed("discrepancies")
+def detect_discrepancies(expected_path, actual_path, count=DISCREPANCY_COUNT, window_seconds=WINDOW_SECONDS):
+    """
+    The count worst (window, kind) differences between the recording
+    (actual_path) and the reference (expected_path), worst first. Each is a
+    dict with timestamp (seconds into the recording), reference_time, kind,
+    severity, discrepancy and suggestion. Windows are distinct unless there
+    are fewer windows than count; differences below MIN_SEVERITY are left
+    out, so a close match can return fewer than count (or none).
+    """
+    params = alignment_parameters(expected_path, actual_path)
+    sr, lag, gain = params["sr"], params["offset"], params["gain"]
+    reference = performance_contour(expected_path, sr)
+    recording = performance_contour(actual_path, sr)
+
+    # Overlap of both recordings on the reference timeline
+    frame_seconds = HOP_LENGTH / sr
+    end = min(len(reference["rms"]), len(recording["rms"]) - lag / frame_seconds) * frame_seconds
+    candidates = []
+    for start in np.arange(max(0.0, -lag), end - window_seconds / 2, window_seconds):
+        stop = min(start + window_seconds, end)
+        for kind, severity, values in _compare_window(reference, recording, start, stop, lag, gain, sr):
+            if severity >= MIN_SEVERITY:
+                candidates.append((float(severity), float(start), kind, values))
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+
+    chosen, used_windows = [], set()
+    for candidate in candidates:
+        if len(chosen) < count and candidate[1] not in used_windows:
+            chosen.append(candidate)
+            used_windows.add(candidate[1])
+    for candidate in candidates:
+        if len(chosen) < count and candidate not in chosen:
+            chosen.append(candidate)
+
+    findings = []
+    for severity, start, kind, values in chosen:
+        discrepancy, suggestion = _describe(kind, values, severity)
+        findings.append({
+            "timestamp": round(max(0.0, start + lag), 1),
+            "reference_time": round(start, 1),
+            "duration": window_seconds,
+            "kind": kind,
+            "severity": round(severity, 2),
+            "discrepancy": discrepancy,
+            "suggestion": suggestion,
+        })
+    return findings
+
+
+def format_advice(findings):
+    """
+    The findings as the numbered Timestamp/Discrepancy/Suggestion text Gemini
+    returns: one entry per finding, so possibly fewer than DISCREPANCY_COUNT,
+    or NO_DISCREPANCIES when there are none.
+    """
+    if not findings:
+        return NO_DISCREPANCIES
+    return "\n\n".join(
+        f"{i}) Timestamp: {finding['timestamp']:.1f} seconds;\n"
+        f"Discrepancy: {finding['discrepancy']};\n"
+        f"Suggestion: {finding['suggestion']};"
+        for i, finding in enumerate(findings, start=1)
+    )
+
+
+def discrepancy_report(expected_path, actual_path, count=None):
+    """The findings and their advice text in one call, for the analysis workers."""
+    findings = detect_discrepancies(expected_path, actual_path, count=count or DISCREPANCY_COUNT)
+    return {"discrepancies": findings, "result": format_advice(findings)}
@@ -0,0 +1,167 @@
+"""
+Module Name: feature_cache.py
+Date: 2026-10-18
+Description:
+    Content-addressed on-disk cache for analysis results (feature dicts and
+    waveform arrays). Entries are keyed by the SHA-256 of the audio bytes plus
+    the analysis parameters, stored as uncompressed .npz files, and evicted
+    least-recently-used first once the cache grows past its size limit.
+
+Usage:
+    features = cached_analysis(path, "features", {"sr": 22050}, compute)
+    print(default_cache.stats())
+
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
+CACHE_DIR = os.environ.get("TUNESYNC_FEATURE_CACHE_DIR", "feature_cache")
+MAX_CACHE_BYTES = int(os.environ.get("TUNESYNC_FEATURE_CACHE_BYTES", 256 * 1024 * 1024))
+
+_HASH_BLOCK = 1 << 20
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, memoized per (path, mtime, size)."""
+    stat = os.stat(path)
+    stat_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _file_hashes_lock:
+        if stat_key in _file_hashes:
+            return _file_hashes[stat_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    content_hash = digest.hexdigest()
+
+    with _file_hashes_lock:
+        _file_hashes[stat_key] = content_hash
+    return content_hash
+
+
+class FeatureCache:
+    """
+    Directory of .npz entries with an LRU size limit and hit/miss counters.
+    Recency is tracked through each entry's mtime, which is bumped on every hit.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash, namespace, params):
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        params_hash = hashlib.sha256(encoded.encode()).hexdigest()[:16]
+        return f"{namespace}-{content_hash[:32]}-{params_hash}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """Return the stored dict of arrays/floats, or None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {
+                    name: data[name].item() if data[name].ndim == 0 else data[name]
+                    for name in data.files
+                }
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        buffer = io.BytesIO()
+        np.savez(buffer, **{name: np.asarray(value) for name, value in entry.items()})
+
+        # Write to a temp file first so readers never see a partial entry
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def size_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory)
+            if name.endswith(".npz")
+        )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size_bytes": self.size_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+default_cache = FeatureCache()
+
+
+def cached_analysis(audio_path, namespace, params, compute, cache=None):
+    """
+    Return compute() for audio_path, reusing a stored result when the same
+    audio content was already analysed with the same params.
+    """
+    cache = cache or default_cache
+    key = cache.make_key(file_hash(audio_path), namespace, params)
+
+    entry = cache.get(key)
+    if entry is None:
+        entry = compute()
+        cache.put(key, entry)
+    return entry
@@ -1,21 +1,46 @@
-import google.genai as genai
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
 import os
+import tempfile
+import threading
+import time
+import soundfile as sf
+from audio_analysis import get_analysis
+from feature_cache import file_hash
+from instrumentation import stage, run_in_context
+from startup import lazy_import
 
-def gen():
-    try:
-        load_dotenv()
-        api_key = os.getenv("API_KEY")
+# Only needed once advice is actually generated (app.py reads ADVICE_MODE at request time)
+genai = lazy_import("google.genai")
+discrepancies = lazy_import("discrepancies")
+
+MODEL = "gemini-2.0-flash"
+
+# Seconds to wait for each file upload before giving up
+UPLOAD_TIMEOUT = 60
+
+# Gemini keeps uploaded files for 48 hours; reuse handles until shortly before that
+UPLOAD_TTL = 47 * 3600
+UPLOAD_EXPIRY_MARGIN = 600
 
-        if not api_key:
-            return {"error": "API_KEY not found in environment variables."}
+MAX_CACHED_ADVICE = 256
 
-        client = genai.Client(api_key=api_key)
+# "local": discrepancies found locally, no network at all
+# "gemini": the local findings plus short clips around them, reworded by Gemini
+# "gemini-full": both whole files sent to Gemini (the original behaviour)
+ADVICE_MODES = ("local", "gemini", "gemini-full")
+ADVICE_MODE = os.environ.get("TUNESYNC_ADVICE_MODE", "local")
 
-        expected = client.files.upload(file='./audio_files/downloaded_audio.mp3')
-        actual = client.files.upload(file='./uploads/recording.wav')
+# Seconds of context on each side of a finding in the clips sent to Gemini
+CLIP_PADDING = 1.0
 
-        prompt = """
+# Shared so a timed-out upload never blocks the request that gave up on it
+_upload_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gemini-upload")
+
+PROMPT = """
         You are an audio analysis tool. You are given two musical performance segments in audio format.
         The task is to:
         1. Compare the two audio files and identify THREE discrepancies in musical elements, such as rhythm, pitch, timing, or any other noteworthy differences among the duration of the WHOLE clip.
@@ -39,16 +64,182 @@ def gen():
 
         """
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[prompt, actual, expected]
-        )
+REWORD_PROMPT = """
+        You are an audio analysis tool helping a musician. An automatic comparison of their recording with the expected performance found the discrepancies below.
+        For each numbered discrepancy you are given two short audio clips, in order: the musician's recording, then the expected performance, both around the timestamp.
+        Listen to the clips and rewrite the Discrepancy and Suggestion of each point so they are specific and useful for practicing the instrument.
+        Keep the numbering and the timestamps EXACTLY as given and keep EXACTLY THIS format, without any other words like an introductory sentence. Don't bold anything.
+        DON'T USE PERIODS AT THE END OF SENTENCES BUT INSTEAD SEMICOLONS. ONLY USE PERIODS FOR THE TIMESTAMP. USE SEMICOLONS BETWEEN EVERY STATEMENT.
+
+        """
+
+# Part of the advice cache key, so editing the prompt or model invalidates old answers
+PROMPT_VERSION = hashlib.sha256((MODEL + PROMPT).encode()).hexdigest()[:12]
+REWORD_PROMPT_VERSION = hashlib.sha256((MODEL + REWORD_PROMPT).encode()).hexdigest()[:12]
+
+class MissingApiKeyError(Exception):
+    pass
+
+class GeminiAdvisor:
+    """
+    Keeps one genai client, remembers uploaded files by content hash until
+    they expire, and caches full advice responses keyed by
+    (reference hash, recording hash, PROMPT_VERSION).
+    client_factory(api_key) can be replaced with a local fake for testing.
+    """
+
+    def __init__(self, client_factory=None, upload_ttl=UPLOAD_TTL, max_advice=MAX_CACHED_ADVICE):
+        self.client_factory = client_factory or (lambda api_key: genai.Client(api_key=api_key))
+        self.upload_ttl = upload_ttl
+        self.max_advice = max_advice
+        self.upload_hits = 0
+        self.advice_hits = 0
+        self._client = None
+        self._uploads = {}  # content hash -> (file handle, expires at)
+        self._advice = OrderedDict()
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                load_dotenv()
+                api_key = os.getenv("API_KEY")
+                if not api_key:
+                    raise MissingApiKeyError("API_KEY not found in environment variables.")
+                self._client = self.client_factory(api_key)
+            return self._client
+
+    def _expires_at(self, uploaded):
+        expiration = getattr(uploaded, 'expiration_time', None)
+        if isinstance(expiration, datetime):
+            return expiration.timestamp() - UPLOAD_EXPIRY_MARGIN
+        return time.time() + self.upload_ttl - UPLOAD_EXPIRY_MARGIN
+
+    def upload(self, path, content_hash=None):
+        content_hash = content_hash or file_hash(path)
+        with self._lock:
+            cached = self._uploads.get(content_hash)
+            if cached and cached[1] > time.time():
+                self.upload_hits += 1
+                return cached[0]
+
+        with stage("gemini_upload"):
+            uploaded = self.client().files.upload(file=path)
+        with self._lock:
+            self._uploads[content_hash] = (uploaded, self._expires_at(uploaded))
+        return uploaded
+
+    def advise(self, expected_path, actual_path):
+        expected_hash, actual_hash = file_hash(expected_path), file_hash(actual_path)
+        key = (expected_hash, actual_hash, PROMPT_VERSION)
+        with self._lock:
+            if key in self._advice:
+                self._advice.move_to_end(key)
+                self.advice_hits += 1
+                return self._advice[key]
+
+        client = self.client()
+
+        # Upload both files at the same time rather than one after the other
+        expected_upload = _upload_pool.submit(run_in_context(self.upload), expected_path, expected_hash)
+        actual_upload = _upload_pool.submit(run_in_context(self.upload), actual_path, actual_hash)
+        expected = expected_upload.result(timeout=UPLOAD_TIMEOUT)
+        actual = actual_upload.result(timeout=UPLOAD_TIMEOUT)
+
+        with stage("gemini_generate"):
+            response = client.models.generate_content(
+                model=MODEL,
+                contents=[PROMPT, actual, expected]
+            )
 
         # result_text = getattr(response, 'text', None)
         # if not isinstance(result_text, str):
         #     result_text = str(result_text) if result_text else "No valid result returned"
 
+        with self._lock:
+            self._advice[key] = response.text
+            while len(self._advice) > self.max_advice:
+                self._advice.popitem(last=False)
         return response.text
 
+    def reword(self, expected_path, actual_path, findings, local_advice):
+        """
+        Ask Gemini to improve the wording of locally found discrepancies. Only
+        a short clip of each file around every finding is uploaded.
+        """
+        text_hash = hashlib.sha256(local_advice.encode()).hexdigest()[:12]
+        key = (file_hash(expected_path), file_hash(actual_path), REWORD_PROMPT_VERSION, text_hash)
+        with self._lock:
+            if key in self._advice:
+                self._advice.move_to_end(key)
+                self.advice_hits += 1
+                return self._advice[key]
+
+        client = self.client()
+        expected, actual = get_analysis(expected_path), get_analysis(actual_path)
+        with tempfile.TemporaryDirectory() as clip_dir:
+            clips = []
+            for i, finding in enumerate(findings):
+                for name, analysis, start in (("recording", actual, finding["timestamp"]),
+                                              ("expected", expected, finding["reference_time"])):
+                    first = int(max(0.0, start - CLIP_PADDING) * analysis.sr)
+                    last = int((start + finding["duration"] + CLIP_PADDING) * analysis.sr)
+                    path = os.path.join(clip_dir, f"{i + 1}-{name}.wav")
+                    sf.write(path, analysis.y[first:last], analysis.sr)
+                    clips.append(path)
+            # Uploaded together; the clips are deterministic, so repeats hit the upload cache
+            uploads = [_upload_pool.submit(run_in_context(self.upload), path) for path in clips]
+            uploaded = [upload.result(timeout=UPLOAD_TIMEOUT) for upload in uploads]
+
+        with stage("gemini_generate"):
+            response = client.models.generate_content(
+                model=MODEL,
+                contents=[REWORD_PROMPT, local_advice, *uploaded]
+            )
+
+        with self._lock:
+            self._advice[key] = response.text
+            while len(self._advice) > self.max_advice:
+                self._advice.popitem(last=False)
+        return response.text
+
+    def stats(self):
+        with self._lock:
+            return {
+                "uploads_cached": len(self._uploads),
+                "upload_hits": self.upload_hits,
+                "advice_cached": len(self._advice),
+                "advice_hits": self.advice_hits,
+                "prompt_version": PROMPT_VERSION,
+            }
+
+default_advisor = GeminiAdvisor()
+
+def gen(expected_path, actual_path, reference_playback=None, mode=None, findings=None):
+    # reference_playback: the reference's playback MP3, uploaded instead of expected_path (which
+    # may be raw PCM) in "gemini-full" mode
+    # findings: detect_discrepancies output when it was already computed (on the analysis workers)
+    mode = mode or ADVICE_MODE
+    if mode not in ADVICE_MODES:
+        return {"error": f"Unknown advice mode: {mode}"}
+    try:
+        if mode == "gemini-full":
+            return default_advisor.advise(reference_playback or expected_path, actual_path)
+
+        if findings is None:
+            findings = discrepancies.detect_discrepancies(expected_path, actual_path)
+        local_advice = discrepancies.format_advice(findings)
+        if mode == "local" or not findings:
+            return local_advice
+        try:
+            return default_advisor.reword(expected_path, actual_path, findings, local_advice)
+        except Exception as e:
+            # The local advice is complete on its own; Gemini only improves the wording
+            print(f"Gemini rewording failed, returning local advice: {str(e)}")
+            return local_advice
+    except MissingApiKeyError as e:
+        return {"error": str(e)}
+    except TimeoutError:
+        return {"error": f"Uploading audio to Gemini took longer than {UPLOAD_TIMEOUT}s."}
     except Exception as e:
         return {"error": str(e)}
@@ -0,0 +1,93 @@
+"""
+Module Name: ingest.py
+Date: 2026-10-18
+Description:
+    Decodes downloaded audio straight to what the analysis stages need:
+    ffmpeg pipes the original stream into mono float32 PCM at ANALYSIS_SR,
+    written as a raw "<name>.<sr>.f32" file that audio_analysis memory-maps.
+    This replaces the forced 192 kbps MP3 transcode followed by repeated
+    librosa decodes. An MP3 is only encoded, once, when a client actually
+    asks to play the file.
+
+Usage:
+    pcm_path = decode_to_pcm("source.webm", "entry/reference")
+    mp3_path = ensure_mp3("source.webm", "entry/reference.mp3")
+
+"""
+
+import os
+import subprocess
+import threading
+
+import imageio_ffmpeg as ffmpeg  # Uses Python-installed FFmpeg
+
+from audio_analysis import ANALYSIS_SR, PCM_EXTENSION, pcm_filename, pcm_sample_rate
+from instrumentation import stage, timed
+
+FFMPEG_PATH = ffmpeg.get_ffmpeg_exe()
+PIPE_BLOCK = 1 << 20
+PLAYBACK_BITRATE = "192k"
+
+_encode_locks = {}
+_encode_locks_lock = threading.Lock()
+
+
+@timed("transcode")
+def decode_to_pcm(source_path, output_stem, sr=ANALYSIS_SR):
+    """
+    Decode any ffmpeg-readable file to mono float32 PCM at sr.
+    Writes "<output_stem>.<sr>.f32" and returns its path.
+    """
+    directory, name = os.path.split(output_stem)
+    output_path = os.path.join(directory, pcm_filename(name, sr))
+    tmp_path = output_path + ".tmp"
+
+    command = [
+        FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-i", source_path,
+        "-vn", "-ac", "1", "-ar", str(sr), "-f", "f32le", "pipe:1",
+    ]
+    # Stream stdout to disk block by block; the decoded track is never held in memory
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        with open(tmp_path, "wb") as f:
+            for block in iter(lambda: process.stdout.read(PIPE_BLOCK), b""):
+                f.write(block)
+        stderr = process.stderr.read().decode(errors="replace")
+        process.wait()
+
+    if process.returncode != 0:
+        os.remove(tmp_path)
+        raise RuntimeError(f"ffmpeg could not decode {source_path}: {stderr.strip()}")
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def ensure_mp3(source_path, mp3_path, bitrate=PLAYBACK_BITRATE, channels=None):
+    """
+    Encode source_path to mp3_path unless it already exists; returns mp3_path.
+    source_path may also be a raw PCM file from decode_to_pcm. channels=1
+    downmixes to mono.
+    """
+    if os.path.exists(mp3_path):
+        return mp3_path
+
+    # One encode per output file even when several clients ask at once
+    with _encode_locks_lock:
+        lock = _encode_locks.setdefault(os.path.abspath(mp3_path), threading.Lock())
+    with lock:
+        if os.path.exists(mp3_path):
+            return mp3_path
+        tmp_path = mp3_path + ".tmp.mp3"
+        input_args = []
+        if source_path.endswith(PCM_EXTENSION):
+            # Raw samples carry no header, so ffmpeg is told the layout
+            input_args = ["-f", "f32le", "-ar", str(pcm_sample_rate(source_path)), "-ac", "1"]
+        output_args = ["-ac", str(channels)] if channels else []
+        with stage("transcode_mp3"):
+            subprocess.run(
+                [FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-y", *input_args, "-i", source_path,
+                 "-vn", *output_args, "-codec:a", "libmp3lame", "-b:a", bitrate, tmp_path],
+                check=True, capture_output=True,
+            )
+        os.replace(tmp_path, mp3_path)
+        print(f"Encoded playback copy {mp3_path}")
+    return mp3_path
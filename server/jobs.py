@@ -0,0 +1,209 @@
+"""
+Module Name: jobs.py
+Date: 2026-10-18
+Description:
+    Background job subsystem for the slow endpoints. A request creates a job
+    and returns its ID right away; a bounded thread pool runs the job's stages
+    (download, waveform, scoring, advice) and records progress in a job store
+    that clients poll or stream. Job state lives in memory by default, or in
+    SQLite so several processes can share it.
+
+Usage:
+    runner = JobRunner(MemoryJobStore(), max_workers=4)
+    job_id = runner.submit("compare_audio", lambda report: do_work(report))
+    runner.store.get(job_id)
+
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = 4
+JOB_QUEUE_LIMIT = 32  # queued + running jobs before new submissions are refused
+JOB_TTL_SECONDS = 3600  # finished jobs are forgotten after this long
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MemoryJobStore:
+    """In-process job store, shared by the worker threads of one process."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, kind):
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": QUEUED,
+            "stage": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+        return job["id"]
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def count_active(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] not in FINISHED)
+
+    def prune(self, max_age=JOB_TTL_SECONDS):
+        cutoff = time.time() - max_age
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items()
+                           if job["status"] in FINISHED and job["updated_at"] < cutoff]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Job store backed by a SQLite file; results are stored as JSON."""
+
+    COLUMNS = ("id", "kind", "status", "stage", "result", "error", "created_at", "updated_at")
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT, status TEXT, stage TEXT, result TEXT, "
+                "error TEXT, created_at REAL, updated_at REAL)"
+            )
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, None, None, None, now, now),
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields if name in self.COLUMNS)
+        values = [value for name, value in fields.items() if name in self.COLUMNS]
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*values, job_id))
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def count_active(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status NOT IN (?, ?)", FINISHED
+        ).fetchone()[0]
+
+    def prune(self, max_age=JOB_TTL_SECONDS):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (*FINISHED, time.time() - max_age),
+            )
+
+
+class JobRunner:
+    """
+    Runs submitted jobs on a bounded thread pool. A job function receives a
+    report(stage) callback for progress and returns a JSON-serializable result.
+    """
+
+    def __init__(self, store, max_workers=JOB_WORKERS, queue_limit=JOB_QUEUE_LIMIT):
+        self.store = store
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, kind, fn):
+        self.store.prune()
+        if self.store.count_active() >= self.queue_limit:
+            raise QueueFullError(f"Too many pending jobs ({self.queue_limit})")
+
+        job_id = self.store.create(kind)
+        self._executor.submit(self._run, job_id, fn)
+        return job_id
+
+    def _run(self, job_id, fn):
+        self.store.update(job_id, status=RUNNING)
+
+        def report(stage):
+            self.store.update(job_id, stage=stage)
+
+        try:
+            result = fn(report)
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+            return
+        self.store.update(job_id, status=DONE, stage=None, result=result)
+
+    def wait(self, job_id, timeout=None, poll_interval=0.05):
+        """Block until the job finishes (mainly for scripts and tests)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def events(self, job_id, poll_interval=0.5):
+        """Yield the job each time its status or stage changes, until it finishes."""
+        last = None
+        while True:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            state = (job["status"], job["stage"])
+            if state != last:
+                last = state
+                yield job
+            if job["status"] in FINISHED:
+                return
+            time.sleep(poll_interval)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,187 @@
+"""
+Module Name: live.py
+Date: 2026-10-18
+Description:
+    Incremental analysis of a take while it is being recorded. PCM chunks
+    are pushed as they arrive from the client; each chunk updates the RMS
+    dynamics, the onset envelope and onset list, and (every
+    ALIGN_INTERVAL seconds) the offset against the reference track. The
+    chunk is also appended to the recording on disk. When the take ends,
+    the final dynamics curve is written to the feature cache, so the
+    waveform of the recording needs no second pass over the file.
+
+Usage:
+    take = LiveTake(sr=48000, reference_path=ref, output_path="recording.wav")
+    for chunk in chunks:
+        messages = take.push(chunk)      # dicts to send back to the client
+    messages, summary = take.finish()
+
+"""
+
+import os
+
+import numpy as np
+import soundfile as sf
+import librosa
+
+from alignment import envelope_lag
+from audio_analysis import get_analysis
+from feature_cache import cached_analysis
+from streaming_dsp import StreamingRMS, StreamingGaussian, StreamingOnsetStrength
+from waveform import FRAME_LENGTH, HOP_LENGTH, SIGMA
+
+ALIGN_INTERVAL = 2.0  # seconds of new audio between alignment updates
+
+# Onset picking on the live envelope (in frames)
+ONSET_PEAK_RADIUS = 3    # must be the largest value within +-radius; also the picking delay
+ONSET_AVERAGE_FRAMES = 10
+ONSET_DELTA = 0.07       # above the local average by this fraction of the loudest onset so far
+ONSET_WAIT = 3
+
+
+class LiveTake:
+    def __init__(self, sr, reference_path=None, output_path=None):
+        self.sr = sr
+        self.output_path = output_path
+        self.samples = 0
+
+        self._rms = StreamingRMS(frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)
+        self._smoother = StreamingGaussian(sigma=SIGMA)
+        self._smoothed = []
+        self._smoothed_count = 0
+        self._rms_min, self._rms_max = np.inf, -np.inf
+
+        # The reference at the take's sample rate, so both envelopes share a frame rate
+        reference = get_analysis(reference_path, sr=sr) if reference_path else None
+        self._reference_envelope = reference.onset_envelope() if reference is not None else None
+        self._onset = StreamingOnsetStrength(
+            sr, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH,
+            initial_max_db=float(reference.mel_db.max()) if reference is not None else -np.inf,
+        )
+        self._envelope = np.zeros(0)
+        self._onsets_checked = 0
+        self._last_onset = -ONSET_WAIT - 1
+        self._loudest_onset = 0.0
+        self._last_alignment = 0
+
+        # Written to a temp name and renamed in finish(), so a half-written take is never served
+        self._file = None
+        if output_path:
+            self._tmp_path = output_path + '.live.wav'
+            self._file = sf.SoundFile(self._tmp_path, mode='w', samplerate=sr, channels=1, subtype='FLOAT')
+
+    def _frame_times(self, start, count):
+        return librosa.frames_to_time(np.arange(start, start + count), sr=self.sr, hop_length=HOP_LENGTH)
+
+    def _dynamics_message(self, rms, smoothed):
+        if len(rms):
+            self._rms_min = min(self._rms_min, float(np.min(rms)))
+            self._rms_max = max(self._rms_max, float(np.max(rms)))
+        if len(smoothed) == 0:
+            return None
+
+        start = self._smoothed_count
+        self._smoothed.append(smoothed)
+        self._smoothed_count += len(smoothed)
+        # Normalized with the range seen so far; rms_min/rms_max let the client rescale
+        span = self._rms_max - self._rms_min
+        dynamics = (smoothed - self._rms_min) / span if span > 0 else np.zeros(len(smoothed))
+        return {
+            "type": "dynamics",
+            "start_index": start,
+            "times": np.round(self._frame_times(start, len(smoothed)), 3).tolist(),
+            "dynamics": np.round(dynamics, 4).tolist(),
+            "rms_min": self._rms_min,
+            "rms_max": self._rms_max,
+        }
+
+    def _pick_onsets(self, final=False):
+        env = self._envelope
+        end = len(env) if final else len(env) - ONSET_PEAK_RADIUS
+        onsets = []
+        for t in range(self._onsets_checked, end):
+            window = env[max(0, t - ONSET_PEAK_RADIUS):t + ONSET_PEAK_RADIUS + 1]
+            average = np.mean(env[max(0, t - ONSET_AVERAGE_FRAMES):t + 1])
+            self._loudest_onset = max(self._loudest_onset, env[t])
+            if (env[t] == window.max() and env[t] > average + ONSET_DELTA * self._loudest_onset
+                    and t - self._last_onset > ONSET_WAIT):
+                onsets.append(t)
+                self._last_onset = t
+        self._onsets_checked = max(end, self._onsets_checked)
+        if not onsets:
+            return None
+        times = librosa.frames_to_time(np.array(onsets), sr=self.sr, hop_length=HOP_LENGTH)
+        return {"type": "onsets", "times": np.round(times, 3).tolist()}
+
+    def _alignment_message(self):
+        if self._reference_envelope is None or len(self._envelope) == 0:
+            return None
+        lag, confidence = envelope_lag(self._reference_envelope, self._envelope)
+        offset = float(lag * HOP_LENGTH / self.sr)
+        return {
+            "type": "alignment",
+            "offset": offset,
+            "confidence": confidence,
+            # Where in the reference the student is right now
+            "reference_position": self.samples / self.sr - offset,
+        }
+
+    def push(self, samples):
+        """Add a chunk of mono float32 samples; returns messages for the client."""
+        samples = np.asarray(samples, dtype=np.float32)
+        if self._file is not None:
+            self._file.write(samples)
+        self.samples += len(samples)
+
+        rms = self._rms.push(samples)
+        messages = [self._dynamics_message(rms, self._smoother.push(rms))]
+
+        self._envelope = np.concatenate((self._envelope, self._onset.push(samples)))
+        messages.append(self._pick_onsets())
+
+        if self.samples - self._last_alignment >= ALIGN_INTERVAL * self.sr:
+            self._last_alignment = self.samples
+            messages.append(self._alignment_message())
+        return [message for message in messages if message is not None]
+
+    def finish(self):
+        """
+        Flush all stages, close the recording and cache its dynamics.
+        Returns (messages, summary).
+        """
+        rms = self._rms.finish()
+        messages = [self._dynamics_message(rms, self._smoother.finish(rms))]
+        self._envelope = np.concatenate((self._envelope, self._onset.finish()))
+        messages.append(self._pick_onsets(final=True))
+        alignment = self._alignment_message()
+        messages.append(alignment)
+
+        summary = {"duration": self.samples / self.sr, "alignment": alignment}
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.replace(self._tmp_path, self.output_path)
+            if self._smoothed_count:
+                self._cache_dynamics()
+        return [message for message in messages if message is not None], summary
+
+    def abort(self):
+        """Discard a take that did not finish (e.g. the client disconnected)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp_path)
+
+    def _cache_dynamics(self):
+        # Same result compute_dynamics would produce for the saved file
+        # (normalizing after smoothing is equivalent, see compute_dynamics_streaming)
+        smoothed = np.concatenate(self._smoothed)
+        span = self._rms_max - self._rms_min
+        data = {
+            "times": self._frame_times(0, len(smoothed)),
+            "dynamics": (smoothed - self._rms_min) / span if span > 0 else np.zeros(len(smoothed)),
+            "sr": self.sr,
+            "duration": self.samples / self.sr,
+        }
+        params = {"frame_length": FRAME_LENGTH, "hop_length": HOP_LENGTH, "sigma": SIGMA}
+        cached_analysis(self.output_path, "waveform", params, lambda: data)
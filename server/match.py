@@ -10,68 +10,106 @@ Usage:
 
 """
 
-import librosa
 import numpy as np
 import soundfile as sf
+from audio_analysis import get_analysis
+from alignment import estimate_offset
+from streaming_dsp import StreamingRMS
 
-def process_student_audio(example_path, student_path, output_path):
-    # Load the example and student audio files.
-    # sr=None loads the audio at its native sampling rate.
-    y_example, sr_example = librosa.load(example_path, sr=None)
-    y_student, sr_student = librosa.load(student_path, sr=None)
-    
-    # Optional: if sample rates differ, resample the student audio to match the example.
-    if sr_example != sr_student:
-        y_student = librosa.resample(y_student, orig_sr=sr_student, target_sr=sr_example)
-        sr_student = sr_example
-
-    # Detect the first onset in the example audio.
-    onset_frames_example = librosa.onset.onset_detect(y=y_example, sr=sr_example, backtrack=True)
-    if len(onset_frames_example) == 0:
-        raise ValueError("No onset detected in example audio.")
-    onset_time_example = librosa.frames_to_time(onset_frames_example[0], sr=sr_example)
-
-    # Detect the first onset in the student audio.
-    onset_frames_student = librosa.onset.onset_detect(y=y_student, sr=sr_student, backtrack=True)
-    if len(onset_frames_student) == 0:
-        raise ValueError("No onset detected in student audio.")
-    onset_time_student = librosa.frames_to_time(onset_frames_student[0], sr=sr_student)
-    
-    # Calculate the time difference.
-    delta = onset_time_student - onset_time_example
-    print(f"Example onset: {onset_time_example:.2f} s, Student onset: {onset_time_student:.2f} s, Delta: {delta:.2f} s")
-    
-    # Align the student audio.
-    if delta > 0:
-        # Student starts later; crop the leading portion.
-        start_sample = int(delta * sr_student)
-        y_student_aligned = y_student[start_sample:]
-    elif delta < 0:
-        # Student starts too early; prepend silence.
-        silence_samples = int(abs(delta) * sr_student)
-        y_student_aligned = np.concatenate((np.zeros(silence_samples), y_student))
-    else:
-        y_student_aligned = y_student
+# Samples per block when measuring and writing the aligned student audio
+BLOCK_SIZE = 65536
+
+def _blocks(y, block_size=BLOCK_SIZE):
+    for start in range(0, len(y), block_size):
+        yield y[start:start + block_size]
+
+def _aligned_blocks(y_student, pad_samples, crop_samples, block_size=BLOCK_SIZE):
+    # The aligned signal (leading silence + cropped student) as views, never concatenated
+    silence = np.zeros(min(pad_samples, block_size), dtype=np.float32)
+    for start in range(0, pad_samples, block_size):
+        yield silence[:min(block_size, pad_samples - start)]
+    yield from _blocks(y_student[crop_samples:], block_size)
+
+def alignment_parameters(example_path, student_path):
+    """
+    Offset and gain that align the student recording to the example, without
+    producing any audio. Clients can apply them at playback time:
+    skip crop_samples (or play pad_samples of silence first) and scale by gain.
+    """
+    # Load the example and student audio files from the shared analysis layer.
+    # The example stays at its native sampling rate; the student audio is
+    # resampled to match it if the sample rates differ.
+    example = get_analysis(example_path)
+    student = get_analysis(student_path, sr=example.sr)
+    sr_student = student.sr
+
+    # Estimate the global offset by cross-correlating the onset envelopes of
+    # both recordings (a stray noise before the first note no longer matters).
+    # alignment.align_recordings(..., dtw=True) also gives a full time-warp map.
+    delta, confidence = estimate_offset(example, student)
+    print(f"Offset: {delta:.2f} s (correlation {confidence:.2f})")
+
+    # Student starts later: crop the leading portion; too early: prepend silence.
+    crop_samples = int(delta * sr_student) if delta > 0 else 0
+    pad_samples = int(abs(delta) * sr_student) if delta < 0 else 0
 
     # Compute RMS values for volume normalization.
-    # Here, we compute the average RMS over the entire audio.
-    rms_example = np.mean(librosa.feature.rms(y=y_example))
-    rms_student = np.mean(librosa.feature.rms(y=y_student_aligned))
-    
+    # Here, we compute the average RMS over the entire audio. The student RMS
+    # is measured block by block on the aligned signal instead of a copy of it.
+    rms_example = np.mean(example.rms())
+    rms_stream = StreamingRMS()
+    rms_sum, rms_frames = 0.0, 0
+    for block in _aligned_blocks(student.y, pad_samples, crop_samples):
+        rms = rms_stream.push(block)
+        rms_sum, rms_frames = rms_sum + float(np.sum(rms)), rms_frames + len(rms)
+    rms = rms_stream.finish()
+    rms_sum, rms_frames = rms_sum + float(np.sum(rms)), rms_frames + len(rms)
+    rms_student = rms_sum / rms_frames if rms_frames else 0.0
+
     if rms_student == 0:
         raise ValueError("Student audio appears silent after alignment.")
 
     # Calculate scaling factor: if student is louder, factor < 1; if softer, factor > 1.
     scaling_factor = rms_example / rms_student
     print(f"RMS (Example): {rms_example:.4f}, RMS (Student): {rms_student:.4f}, Scaling factor: {scaling_factor:.4f}")
-    
-    # Adjust the volume of the student audio.
-    y_student_adjusted = y_student_aligned * scaling_factor
 
-    # Write the processed student audio to file.
-    sf.write(output_path, y_student_adjusted, sr_student)
-    print(f"Processed student audio saved to {output_path}")
-    
+    return {
+        "offset": float(delta),
+        "confidence": confidence,
+        "gain": float(scaling_factor),
+        "sr": sr_student,
+        "crop_samples": crop_samples,
+        "pad_samples": pad_samples,
+    }
+
+def process_student_audio(example_path, student_path, output_path=None, return_audio=True):
+    """
+    Align and volume-match the student recording to the example.
+    Writes the result to output_path (if given) block by block and returns
+    it as one float32 array; with return_audio=False only the
+    alignment_parameters() dict is returned and no full-length array is built.
+    """
+    params = alignment_parameters(example_path, student_path)
+    y_student = get_analysis(student_path, sr=params["sr"]).y
+    gain = np.float32(params["gain"])
+    pad_samples, crop_samples = params["pad_samples"], params["crop_samples"]
+
+    # Gain is applied block by block into one reusable float32 buffer; the
+    # shared (possibly memory-mapped) decode is never modified
+    if output_path:
+        buffer = np.empty(BLOCK_SIZE, dtype=np.float32)
+        with sf.SoundFile(output_path, mode='w', samplerate=params["sr"], channels=1) as f:
+            for block in _aligned_blocks(y_student, pad_samples, crop_samples):
+                out = buffer[:len(block)]
+                np.multiply(block, gain, out=out)
+                f.write(out)
+        print(f"Processed student audio saved to {output_path}")
+
+    if not return_audio:
+        return params
+
+    y_student_adjusted = np.zeros(pad_samples + max(len(y_student) - crop_samples, 0), dtype=np.float32)
+    np.multiply(y_student[crop_samples:], gain, out=y_student_adjusted[pad_samples:])
     return y_student_adjusted
 
 # Example usage:
@@ -1,49 +1,25 @@
-import yt_dlp
+# Run from the server directory: python -m model.gen_data
 import os
-import imageio_ffmpeg as ffmpeg  # Uses Python-installed FFmpeg
+from reference_library import ReferenceLibrary, link_or_copy  # Shared, deduplicating YouTube downloader
+from model.model import DATASET_DIR
 
-# Get the FFmpeg path from imageio_ffmpeg
-FFMPEG_PATH = ffmpeg.get_ffmpeg_exe()  # Correct function name
+# Training clips go through the same library as /process_youtube, so a clip
+# that was already downloaded (by either) is not fetched again.
+library = ReferenceLibrary(precompute=False)
 
-def download_youtube_audio(youtube_url, output_mp3="output.mp3"):
+def add_to_dataset(youtube_url, output_mp3="output.mp3"):
     """
-    Downloads the audio from a YouTube video and converts it into an MP3 file.
+    Fetches the audio of a YouTube video/clip through the reference library
+    and places it in the dataset folder.
     """
 
-    if not os.path.exists("model/dataset"):
-        os.makedirs("model/dataset")
-    
-    output_path = os.path.join("model/dataset", output_mp3)
+    if not os.path.exists(DATASET_DIR):
+        os.makedirs(DATASET_DIR)
 
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'noplaylist': True,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192'
-        }],
-        'postprocessor_args': ['-ss', "00:00:00"], 
-        'outtmpl': 'downloaded_audio.%(ext)s',
-        'ffmpeg_location': FFMPEG_PATH
-    }
-
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([youtube_url])  # Download video/audio
-
-    # Find the downloaded MP3 file and move it to the audio_files folder
-    for file in os.listdir():
-        if file.startswith("downloaded_audio") and file.endswith(".mp3"):
-            temp_mp3_path = os.path.join(os.getcwd(), file)  # Get the current file path
-            if os.path.exists(output_path):
-                os.remove(output_path)  # Remove the old file if it exists
-            os.rename(temp_mp3_path, output_path)  # Rename and move it to the audio_files folder
-            print(f"✅ Download complete! Saved as: {output_path}")
-            return output_path
-
-    print("❌ Error: No MP3 file found after download.")
-    return None
+    # The dataset keeps MP3s, so the playback copy is encoded here
+    output_path = link_or_copy(library.get(youtube_url).mp3_path(), os.path.join(DATASET_DIR, output_mp3))
+    print(f"✅ Saved as: {output_path}")
+    return output_path
 
 # links = [
 #     "https://www.youtube.com/watch?v=CRQ9lFZK3kg",
@@ -67,6 +43,7 @@ links = [
     "https://youtube.com/clip/UgkxvTlCVuEz72gm88uQnTrIJYi6IeJK_yOJ?si=gVcFi33gFhqgKxzi",
     "https://youtube.com/clip/UgkxJMWvwzgFDKQGYj38a6mTolEbglFgGDfh?si=nvK7mkikItBxtJv_"
 ]
-for i, link in enumerate(links):
-    path = "".join([str(i+11), ".mp3"])
-    download_youtube_audio(link, path)
+if __name__ == "__main__":
+    for i, link in enumerate(links):
+        path = "".join([str(i+11), ".mp3"])
+        add_to_dataset(link, path)
@@ -1,3 +1,4 @@
+import argparse
 import librosa
 import os
 import numpy as np
@@ -6,42 +7,150 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import GridSearchCV, train_test_split
 import pandas as pd
 import joblib
+import json
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from typing import Tuple, Dict
 from pathlib import Path
+from audio_analysis import AudioAnalysis, get_analysis, N_FFT, HOP_LENGTH, ANALYSIS_SR
+from feature_cache import cached_analysis, file_hash
+from instrumentation import stage, timed
 
-def extract_performance_features(audio_path):
+# Sample rate all scoring features are computed at (librosa.load default)
+FEATURE_SR = ANALYSIS_SR
+N_MFCC = 13
+
+# Column order of the feature matrix the model was trained on
+FEATURE_NAMES = [
+    'pitch_std', 'pitch_mean', 'tempo', 'rhythm_stability', 'beat_strength',
+    'dynamic_range', 'dynamic_std', 'timbre_avg', 'timbre_std', 'spectral_std'
+]
+
+# Hyperparameter grid searched by PerformanceScorer.train_new
+PARAM_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [3, 5, 7],
+    'min_samples_split': [2, 5]
+}
+
+# Resolved from this file, so training works from any working directory
+# (run it from server/ as `python -m model.model`, which puts the server modules on sys.path)
+MODEL_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(MODEL_PACKAGE_DIR, 'dataset')
+TRAINED_MODEL_DIR = os.path.join(os.path.dirname(MODEL_PACKAGE_DIR), 'trained_model')
+
+# Saved next to the dataset so retraining never decodes audio again
+DATASET_FEATURES_FILE = 'features.npz'
+
+# Written next to model.joblib so scoring uses the features the model was trained on
+MODEL_METADATA_FILE = 'metadata.json'
+
+# Pitch feature backends (see PITCH_BACKENDS below):
+#   piptrack - full piptrack matrices, global median mask (original implementation)
+#   stream   - same values as piptrack, reduced block by block with running stats
+#   decimate - stream on every PITCH_DECIMATION-th STFT frame (approximate, needs retraining)
+PITCH_BACKEND = 'stream'
+PITCH_BLOCK_FRAMES = 256  # STFT frames per piptrack call in the stream backend
+PITCH_DECIMATION = 4
+
+# Models saved before the backend was recorded were trained on piptrack features,
+# which the stream backend reproduces exactly
+LEGACY_PITCH_BACKEND = 'stream'
+
+def feature_params(pitch_backend=PITCH_BACKEND):
+    """Parameters that determine the extracted feature values"""
+    return {'sr': FEATURE_SR, 'n_fft': N_FFT, 'hop_length': HOP_LENGTH, 'n_mfcc': N_MFCC,
+            'pitch_backend': pitch_backend}
+
+def extract_performance_features(audio_path, pitch_backend=PITCH_BACKEND):
     """
     Extract enhanced musical features from an audio segment
+    Accepts a file path or an already decoded AudioAnalysis
     Returns features as a dictionary for clearer feature tracking
     """
-    # Load the audio file
-    y, sr = librosa.load(audio_path)
-    
-    # Enhanced pitch features
-    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+    if pitch_backend not in PITCH_BACKENDS:
+        raise ValueError(f"Unknown pitch backend: {pitch_backend}")
+
+    if isinstance(audio_path, AudioAnalysis):
+        return _compute_performance_features(audio_path.resampled(FEATURE_SR), pitch_backend)
+
+    # Reuse features of audio content we have already scored
+    features = cached_analysis(
+        audio_path, 'features', feature_params(pitch_backend),
+        lambda: _compute_performance_features(get_analysis(audio_path, sr=FEATURE_SR), pitch_backend)
+    )
+    return {name: float(features[name]) for name in FEATURE_NAMES}
+
+def _pitch_stats_piptrack(analysis):
+    pitches, magnitudes = analysis.pitch_track()
     pitch_mask = magnitudes > np.median(magnitudes)
     pitch_std = np.std(pitches[pitch_mask]) if len(pitch_mask) > 0 else 0
     pitch_mean = np.mean(pitches[pitch_mask]) if len(pitch_mask) > 0 else 0
+    return pitch_mean, pitch_std
+
+def _pitch_stats_stream(analysis, frame_step=1):
+    """
+    piptrack works frame by frame, so it is run on slices of the STFT and only
+    a running count/mean/M2 of the selected pitches is kept (Chan's parallel
+    variance). piptrack only marks strict local peaks, so fewer than half of
+    its magnitudes are non-zero: the global median is always 0 and the
+    "> median" mask is the same as "> 0".
+    """
+    S = analysis.stft_magnitude[:, ::frame_step]
+    count, mean, m2 = 0, 0.0, 0.0
+    for start in range(0, S.shape[1], PITCH_BLOCK_FRAMES):
+        pitches, magnitudes = librosa.piptrack(S=S[:, start:start + PITCH_BLOCK_FRAMES], sr=analysis.sr)
+        selected = pitches[magnitudes > 0].astype(np.float64)
+        if len(selected) == 0:
+            continue
+        block_mean = selected.mean()
+        block_m2 = np.sum((selected - block_mean) ** 2)
+        total = count + len(selected)
+        delta = block_mean - mean
+        mean += delta * len(selected) / total
+        m2 += block_m2 + delta ** 2 * count * len(selected) / total
+        count = total
+
+    if count == 0:
+        return 0, 0
+    return mean, np.sqrt(m2 / count)
+
+def _pitch_stats_decimate(analysis):
+    return _pitch_stats_stream(analysis, frame_step=PITCH_DECIMATION)
+
+PITCH_BACKENDS = {
+    'piptrack': _pitch_stats_piptrack,
+    'stream': _pitch_stats_stream,
+    'decimate': _pitch_stats_decimate,
+}
+
+@timed('features')
+def _compute_performance_features(analysis, pitch_backend=PITCH_BACKEND):
+    # Enhanced pitch features
+    with stage('pitch'):
+        pitch_mean, pitch_std = PITCH_BACKENDS[pitch_backend](analysis)
     
     # Enhanced rhythm features
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
+    onset_env = analysis.onset_envelope()
+    tempo, beats = analysis.beats()
+    # Newer librosa returns the tempo as a 1-element array
+    tempo = np.atleast_1d(tempo)[0]
     tempo_stability = np.std(onset_env) if len(onset_env) > 0 else 0
     beat_strength = np.mean(onset_env[beats]) if len(beats) > 0 else 0
     
     # Dynamic range
-    rms = librosa.feature.rms(y=y)[0]
+    rms = analysis.rms()
     dynamic_range = np.max(rms) - np.min(rms) if len(rms) > 0 else 0
     dynamic_std = np.std(rms) if len(rms) > 0 else 0
     
     # Timbre features
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    mfcc = analysis.mfcc(n_mfcc=N_MFCC)
     mfcc_mean = np.mean(mfcc, axis=1)
     timbre_avg = float(np.mean(mfcc_mean))
     timbre_std = float(np.std(mfcc_mean))
     
     # Spectral features
-    spectral = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    spectral = analysis.spectral_centroid()
     spectral_std = np.std(spectral) if len(spectral) > 0 else 0
     
     # Return features as a dictionary with explicit float conversions
@@ -60,36 +169,175 @@ def extract_performance_features(audio_path):
     
     return features
 
+def _extract_feature_row(audio_path, pitch_backend=PITCH_BACKEND):
+    """Process pool worker: returns (feature row, seconds taken)"""
+    start = time.perf_counter()
+    features = extract_performance_features(audio_path, pitch_backend)
+    return [features[name] for name in FEATURE_NAMES], time.perf_counter() - start
+
+def _load_dataset_features(features_path, params_key):
+    if not features_path or not os.path.exists(features_path):
+        return {}
+    with np.load(features_path, allow_pickle=False) as data:
+        if str(data['params']) != params_key or list(data['feature_names']) != FEATURE_NAMES:
+            print(f"Ignoring {features_path}: feature parameters changed")
+            return {}
+        return {str(h): row for h, row in zip(data['hashes'], data['features'])}
+
+def _save_dataset_features(features_path, params_key, rows_by_hash):
+    hashes = sorted(rows_by_hash)
+    features = np.array([rows_by_hash[h] for h in hashes], dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+    tmp_path = features_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            hashes=np.array(hashes, dtype=str),
+            features=features,
+            feature_names=np.array(FEATURE_NAMES),
+            params=np.array(params_key)
+        )
+    os.replace(tmp_path, features_path)
+
+def _submit_feature_rows(audio_files, pending, workers, pitch_backend):
+    """Yield (hash, index, finished future) for each pending file"""
+    if len(pending) == 1 or workers == 1:
+        # Not worth starting worker processes
+        for h, i in pending.items():
+            future = Future()
+            try:
+                future.set_result(_extract_feature_row(audio_files[i], pitch_backend))
+            except Exception as e:
+                future.set_exception(e)
+            yield h, i, future
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_extract_feature_row, audio_files[i], pitch_backend): (h, i)
+            for h, i in pending.items()
+        }
+        for future in as_completed(futures):
+            yield (*futures[future], future)
+
+def extract_dataset_features(audio_files: list, workers: int = None, features_path: str = None,
+                             pitch_backend: str = PITCH_BACKEND):
+    """
+    Extract the feature matrix for a list of audio files in a process pool
+    Rows already stored in features_path (keyed by file content hash) are reused
+    Returns (X, kept) where kept lists the indices of files that succeeded
+    """
+    params_key = json.dumps(feature_params(pitch_backend), sort_keys=True)
+    rows_by_hash = _load_dataset_features(features_path, params_key)
+
+    hashes = [file_hash(audio_file) for audio_file in audio_files]
+    pending = {}
+    for i, h in enumerate(hashes):
+        if h not in rows_by_hash:
+            pending.setdefault(h, i)
+    print(f"Features cached for {len(audio_files) - len(pending)}/{len(audio_files)} files")
+
+    if pending:
+        start = time.perf_counter()
+        for done, (h, i, future) in enumerate(_submit_feature_rows(audio_files, pending, workers, pitch_backend), 1):
+            try:
+                row, seconds = future.result()
+                rows_by_hash[h] = row
+                print(f"Processed file {done}/{len(pending)}: {audio_files[i]} ({seconds:.2f}s)")
+            except Exception as e:
+                print(f"Error processing {audio_files[i]}: {str(e)}")
+        print(f"Extracted {len(pending)} files in {time.perf_counter() - start:.2f}s")
+
+        if features_path:
+            _save_dataset_features(features_path, params_key, rows_by_hash)
+
+    kept = [i for i, h in enumerate(hashes) if h in rows_by_hash]
+    X = np.array([rows_by_hash[hashes[i]] for i in kept], dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+    return X, kept
+
+class FlatForest:
+    """
+    A fitted tree ensemble flattened into padded NumPy arrays so every tree
+    is evaluated for every row in one vectorized pass instead of one
+    tree.predict call per estimator.
+    """
+    def __init__(self, estimators):
+        trees = [estimator.tree_ for estimator in estimators]
+        n_trees = len(trees)
+        max_nodes = max(tree.node_count for tree in trees)
+
+        # Padding nodes are leaves (-1 children) so they are never entered
+        self.children_left = np.full((n_trees, max_nodes), -1, dtype=np.intp)
+        self.children_right = np.full((n_trees, max_nodes), -1, dtype=np.intp)
+        self.feature = np.zeros((n_trees, max_nodes), dtype=np.intp)
+        self.threshold = np.zeros((n_trees, max_nodes), dtype=np.float64)
+        self.value = np.zeros((n_trees, max_nodes), dtype=np.float64)
+
+        for t, tree in enumerate(trees):
+            n = tree.node_count
+            self.children_left[t, :n] = tree.children_left
+            self.children_right[t, :n] = tree.children_right
+            self.feature[t, :n] = np.maximum(tree.feature, 0)
+            self.threshold[t, :n] = tree.threshold
+            self.value[t, :n] = tree.value[:, 0, 0]
+
+        self.n_trees = n_trees
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+    def predict_all(self, X) -> np.ndarray:
+        """
+        Return per-tree predictions with shape (n_samples, n_trees)
+        """
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_samples = X.shape[0]
+        tree_idx = np.arange(self.n_trees)[np.newaxis, :]
+        row_idx = np.arange(n_samples)[:, np.newaxis]
+        node = np.zeros((n_samples, self.n_trees), dtype=np.intp)
+
+        for _ in range(self.max_depth):
+            left = self.children_left[tree_idx, node]
+            is_leaf = left == -1
+            if is_leaf.all():
+                break
+            go_left = X[row_idx, self.feature[tree_idx, node]] <= self.threshold[tree_idx, node]
+            next_node = np.where(go_left, left, self.children_right[tree_idx, node])
+            node = np.where(is_leaf, node, next_node)
+
+        return self.value[tree_idx, node]
+
 class PerformanceScorer:
-    def __init__(self, model=None, scaler=None):
+    def __init__(self, model=None, scaler=None, pitch_backend=LEGACY_PITCH_BACKEND):
         self.model = model
         self.scaler = scaler
+        self.pitch_backend = pitch_backend
+        self._flat_forest = None
+
+    @property
+    def flat_forest(self) -> FlatForest:
+        # Built on first use and reused for every later prediction
+        if self._flat_forest is None:
+            self._flat_forest = FlatForest(self.model.estimators_)
+        return self._flat_forest
     
     @classmethod
-    def train_new(cls, audio_files: list, scores: list) -> 'PerformanceScorer':
+    def train_new(cls, audio_files: list, scores: list, workers: int = None,
+                  features_path: str = None, param_grid: dict = None,
+                  pitch_backend: str = PITCH_BACKEND) -> 'PerformanceScorer':
         """
         Create and train a new scorer with optimization
+        Features are extracted in parallel and reused from features_path if given
         """
-        print("Training new model...")
-        features_list = []
+        print(f"Training new model (pitch backend: {pitch_backend})...")
         
         # Extract features and ensure we have the same number of features as scores
-        for i, audio_file in enumerate(audio_files):
-            if i >= len(scores):
-                break
-            try:
-                features = extract_performance_features(audio_file)
-                features_list.append(list(features.values()))
-                print(f"Processed file {i+1}/{len(audio_files)}")
-            except Exception as e:
-                print(f"Error processing {audio_file}: {str(e)}")
-                continue
+        audio_files = audio_files[:len(scores)]
+        X, kept = extract_dataset_features(audio_files, workers=workers, features_path=features_path,
+                                           pitch_backend=pitch_backend)
         
-        if not features_list:
+        if len(kept) == 0:
             raise ValueError("No features could be extracted from the audio files")
         
-        X = np.array(features_list)
-        y = np.array(scores[:len(features_list)])
+        y = np.array([scores[i] for i in kept])
         
         print(f"Feature matrix shape: {X.shape}")
         print(f"Labels shape: {y.shape}")
@@ -104,12 +352,8 @@ class PerformanceScorer:
         X_train_scaled = scaler.fit_transform(X_train)
         X_test_scaled = scaler.transform(X_test)
         
-        # Define parameter grid for optimization
-        param_grid = {
-            'n_estimators': [50, 100, 200],
-            'max_depth': [3, 5, 7],
-            'min_samples_split': [2, 5]
-        }
+        # Parameter grid for optimization
+        param_grid = param_grid or PARAM_GRID
         
         # Perform grid search
         base_model = RandomForestRegressor(random_state=42)
@@ -132,26 +376,50 @@ class PerformanceScorer:
         print(f"Train R² score: {train_score:.3f}")
         print(f"Test R² score: {test_score:.3f}")
         
-        return cls(model, scaler)
+        return cls(model, scaler, pitch_backend)
     
+    def score_features(self, features_matrix) -> list:
+        """
+        Score a matrix of performances (one row of FEATURE_NAMES values per
+        performance) and return confidence metrics for each row
+        """
+        with stage('inference'):
+            features_scaled = self.scaler.transform(np.atleast_2d(features_matrix))
+            tree_predictions = self.flat_forest.predict_all(features_scaled)
+
+        scores = np.clip(np.mean(tree_predictions, axis=1), 0, 100)
+        confidences = 100 - np.std(tree_predictions, axis=1)
+        lower, upper = np.clip(np.percentile(tree_predictions, [25, 75], axis=1), 0, 100)
+
+        return [
+            {
+                'score': round(float(scores[i]), 1),
+                'confidence': round(float(confidences[i]), 1),
+                'min_score': round(float(lower[i]), 1),
+                'max_score': round(float(upper[i]), 1)
+            }
+            for i in range(len(scores))
+        ]
+
+    def score_batch(self, audio_paths: list, workers: int = None) -> list:
+        """
+        Score many performances at once: features are extracted in parallel
+        across processes and all rows go through the forest in one call.
+        Returns confidence metrics per path, or None where extraction failed
+        """
+        X, kept = extract_dataset_features(audio_paths, workers=workers, pitch_backend=self.pitch_backend)
+        results = [None] * len(audio_paths)
+        if kept:
+            for i, metrics in zip(kept, self.score_features(X)):
+                results[i] = metrics
+        return results
+
     def score_performance(self, audio_path: str) -> Tuple[float, Dict[str, float]]:
         """
         Score a new performance and return confidence metrics
         """
-        features = extract_performance_features(audio_path)
-        features_array = np.array(list(features.values())).reshape(1, -1)
-        features_scaled = self.scaler.transform(features_array)
-        
-        tree_predictions = [tree.predict(features_scaled)[0] 
-                          for tree in self.model.estimators_]
-        
-        score = np.mean(tree_predictions)
-        confidence_metrics = {
-            'score': round(np.clip(score, 0, 100), 1),
-            'confidence': round(100 - np.std(tree_predictions), 1),
-            'min_score': round(np.clip(np.percentile(tree_predictions, 25), 0, 100), 1),
-            'max_score': round(np.clip(np.percentile(tree_predictions, 75), 0, 100), 1)
-        }
+        features = extract_performance_features(audio_path, self.pitch_backend)
+        confidence_metrics = self.score_features([[features[name] for name in FEATURE_NAMES]])[0]
         
         return confidence_metrics['score'], confidence_metrics
     
@@ -160,16 +428,27 @@ class PerformanceScorer:
         directory.mkdir(parents=True, exist_ok=True)
         joblib.dump(self.model, directory / "model.joblib")
         joblib.dump(self.scaler, directory / "scaler.joblib")
+        with open(directory / MODEL_METADATA_FILE, 'w') as f:
+            json.dump({
+                'pitch_backend': self.pitch_backend,
+                'feature_names': FEATURE_NAMES,
+                'feature_params': feature_params(self.pitch_backend)
+            }, f, indent=2)
     
     @classmethod
+    @timed('model_load')
     def load(cls, directory: str) -> 'PerformanceScorer':
         directory = Path(directory)
         model = joblib.load(directory / "model.joblib")
         scaler = joblib.load(directory / "scaler.joblib")
-        return cls(model, scaler)
+        metadata = {}
+        if (directory / MODEL_METADATA_FILE).exists():
+            with open(directory / MODEL_METADATA_FILE) as f:
+                metadata = json.load(f)
+        return cls(model, scaler, metadata.get('pitch_backend', LEGACY_PITCH_BACKEND))
 
-def train_model():
-    dataset_folder = './dataset/'
+def train_model(workers: int = None, pitch_backend: str = PITCH_BACKEND,
+                dataset_folder: str = DATASET_DIR, output_dir: str = TRAINED_MODEL_DIR):
     training_files = []
     for filename in os.listdir(dataset_folder):
         if filename.endswith('.mp3'):
@@ -179,17 +458,23 @@ def train_model():
     training_scores = [20, 55, 95, 10, 15, 75, 80, 80, 95, 97, 78, 100, 95, 74, 80, 90, 90]
     
     # Create and train scorer
-    scorer = PerformanceScorer.train_new(training_files, training_scores)
-    scorer.save("trained_model")
+    scorer = PerformanceScorer.train_new(
+        training_files, training_scores, workers=workers,
+        features_path=os.path.join(dataset_folder, DATASET_FEATURES_FILE),
+        pitch_backend=pitch_backend
+    )
+    scorer.save(output_dir)
+    print(f"Saved model to {output_dir}")
 
-# def main():
-#     # used for testing model
-#     loaded_scorer = PerformanceScorer.load("trained_model")
-#     score, confidence = loaded_scorer.score_performance('../audio_files/downloaded_audio.mp3')
-    
-#     print(f"Performance Score: {score}/100")
-#     print(f"Confidence: {confidence['confidence']}%")
-#     print(f"Score Range: {confidence['min_score']}-{confidence['max_score']}")
+def main():
+    parser = argparse.ArgumentParser(description="Train the performance scorer on model/dataset.")
+    parser.add_argument("--workers", type=int, default=None, help="feature extraction processes")
+    parser.add_argument("--pitch-backend", choices=sorted(PITCH_BACKENDS), default=PITCH_BACKEND)
+    parser.add_argument("--dataset", default=DATASET_DIR, help="folder of training MP3s")
+    parser.add_argument("--output", default=TRAINED_MODEL_DIR, help="where the model is saved")
+    args = parser.parse_args()
+    train_model(workers=args.workers, pitch_backend=args.pitch_backend,
+                dataset_folder=args.dataset, output_dir=args.output)
 
-# if __name__ == "__main__":
-#     main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Module Name: pitch_benchmark.py
+Date: 2026-10-18
+Description:
+    Compares the pitch feature backends of model.py on real recordings:
+    time and peak memory of the pitch step, and how far pitch_mean /
+    pitch_std (and the resulting score) move away from the original
+    piptrack features. The STFT is computed once up front because every
+    other feature needs it anyway.
+
+Usage (from the server directory):
+    python -m model.pitch_benchmark                    # all files in model/dataset
+    python -m model.pitch_benchmark a.wav b.mp3 ...
+
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import librosa
+
+from audio_analysis import AudioAnalysis
+from model.model import (PITCH_BACKENDS, FEATURE_SR, FEATURE_NAMES, DATASET_DIR, TRAINED_MODEL_DIR,
+                         PerformanceScorer, _compute_performance_features)
+
+REFERENCE_BACKEND = "piptrack"
+
+
+def measure(backend, y, sr, stft_magnitude):
+    analysis = AudioAnalysis(y, sr)
+    analysis.stft_magnitude = stft_magnitude  # shared, so only the pitch step is measured
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    pitch_mean, pitch_std = PITCH_BACKENDS[backend](analysis)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"seconds": seconds, "peak_mb": peak / 1024 ** 2,
+            "pitch_mean": float(pitch_mean), "pitch_std": float(pitch_std), "analysis": analysis}
+
+
+def score(scorer, analysis, backend):
+    if scorer is None:
+        return None
+    features = _compute_performance_features(analysis, backend)
+    return scorer.score_features([[features[name] for name in FEATURE_NAMES]])[0]["score"]
+
+
+def main(audio_files):
+    try:
+        scorer = PerformanceScorer.load(TRAINED_MODEL_DIR)
+    except Exception as e:
+        print(f"No trained model, skipping score comparison ({str(e)})")
+        scorer = None
+
+    totals = {backend: {"seconds": 0.0, "peak_mb": 0.0, "mean_err": [], "std_err": [], "score_diff": []}
+              for backend in PITCH_BACKENDS}
+
+    for audio_file in audio_files:
+        y, sr = librosa.load(audio_file, sr=FEATURE_SR)
+        stft_magnitude = AudioAnalysis(y, sr).stft_magnitude
+        results = {backend: measure(backend, y, sr, stft_magnitude) for backend in PITCH_BACKENDS}
+        reference = results[REFERENCE_BACKEND]
+        reference_score = score(scorer, reference["analysis"], REFERENCE_BACKEND)
+
+        print(f"\n{audio_file} ({len(y) / sr:.1f}s)")
+        for backend, result in results.items():
+            mean_err = abs(result["pitch_mean"] - reference["pitch_mean"]) / max(abs(reference["pitch_mean"]), 1e-9)
+            std_err = abs(result["pitch_std"] - reference["pitch_std"]) / max(abs(reference["pitch_std"]), 1e-9)
+            backend_score = score(scorer, result["analysis"], backend)
+            score_diff = abs(backend_score - reference_score) if scorer is not None else None
+
+            total = totals[backend]
+            total["seconds"] += result["seconds"]
+            total["peak_mb"] = max(total["peak_mb"], result["peak_mb"])
+            total["mean_err"].append(mean_err)
+            total["std_err"].append(std_err)
+            if score_diff is not None:
+                total["score_diff"].append(score_diff)
+
+            print(f"  {backend:9s} {result['seconds'] * 1000:8.1f} ms  peak {result['peak_mb']:7.1f} MB  "
+                  f"pitch_mean {result['pitch_mean']:8.1f} ({mean_err:6.1%})  "
+                  f"pitch_std {result['pitch_std']:8.1f} ({std_err:6.1%})"
+                  + (f"  score {backend_score:5.1f}" if backend_score is not None else ""))
+
+    print(f"\nSummary over {len(audio_files)} files (errors relative to {REFERENCE_BACKEND}):")
+    for backend, total in totals.items():
+        line = (f"  {backend:9s} total {total['seconds']:7.2f}s  max peak {total['peak_mb']:7.1f} MB  "
+                f"mean err {np.mean(total['mean_err']):6.1%}  std err {np.mean(total['std_err']):6.1%}")
+        if total["score_diff"]:
+            line += f"  mean |score diff| {np.mean(total['score_diff']):.2f}"
+        print(line)
+    print("Backends other than piptrack/stream change the features; retrain before scoring with them.")
+
+
+if __name__ == "__main__":
+    files = sys.argv[1:] or sorted(
+        os.path.join(DATASET_DIR, name) for name in os.listdir(DATASET_DIR) if name.endswith(".mp3")
+    )
+    main(files)
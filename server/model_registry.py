@@ -0,0 +1,145 @@
+"""
+Module Name: model_registry.py
+Date: 2026-10-18
+Description:
+    Process-wide registry for the trained PerformanceScorer. The model and
+    scaler are deserialized once and shared by all worker threads. When the
+    files in trained_model/ change, the new model is loaded next to the old
+    one and swapped in atomically, so requests never wait on model I/O.
+
+Usage:
+    scorer = default_registry.get()
+    print(default_registry.info())
+
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from model.model import PerformanceScorer, MODEL_METADATA_FILE, TRAINED_MODEL_DIR
+
+# Where `python -m model.model` saves, independent of the server's working directory
+MODEL_DIR = TRAINED_MODEL_DIR
+MODEL_FILES = ('model.joblib', 'scaler.joblib')
+OPTIONAL_MODEL_FILES = (MODEL_METADATA_FILE,)  # older models were saved without it
+
+# How often (seconds) get() is allowed to stat the model files for changes
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+class ModelRegistry:
+    def __init__(self, directory=MODEL_DIR, check_interval=RELOAD_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._scorer = None
+        self._signature = None
+        self._version = None
+        self._loaded_at = None
+        self._load_seconds = None
+        self._loads = 0
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+        # Held while one thread checks the files or reloads; others skip instead of waiting
+        self._reload_lock = threading.Lock()
+
+    def _model_files(self):
+        optional = [name for name in OPTIONAL_MODEL_FILES
+                    if os.path.exists(os.path.join(self.directory, name))]
+        return list(MODEL_FILES) + optional
+
+    def _file_signature(self):
+        signature = []
+        for name in self._model_files():
+            stat = os.stat(os.path.join(self.directory, name))
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _file_version(self):
+        digest = hashlib.sha256()
+        for name in self._model_files():
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        return digest.hexdigest()[:12]
+
+    def load(self):
+        """Load (or reload) the scorer from disk and swap it in."""
+        with self._load_lock:
+            return self._load_locked()
+
+    def _load_locked(self):
+        signature = self._file_signature()
+        start = time.perf_counter()
+        scorer = PerformanceScorer.load(self.directory)
+        version = self._file_version()
+        elapsed = time.perf_counter() - start
+
+        # Single reference assignment, so readers see either model, never a mix
+        self._scorer = scorer
+        self._signature = signature
+        self._version = version
+        self._loaded_at = time.time()
+        self._load_seconds = elapsed
+        self._loads += 1
+        print(f"Loaded model {version} from {self.directory} in {elapsed:.3f}s")
+        return scorer
+
+    def _reload_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Model reload failed, keeping version {self._version}: {str(e)}")
+        finally:
+            self._reload_lock.release()
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return  # another thread is checking or reloading
+
+        reloading = False
+        try:
+            now = time.monotonic()
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            try:
+                changed = self._file_signature() != self._signature
+            except OSError:
+                # Files are mid-replacement; keep serving the current model
+                return
+            if not changed:
+                return
+
+            # Load the new files off the request path; callers keep the old model.
+            # The thread releases _reload_lock when it is done.
+            threading.Thread(target=self._reload_in_background, daemon=True).start()
+            reloading = True
+        finally:
+            if not reloading:
+                self._reload_lock.release()
+
+    def get(self) -> PerformanceScorer:
+        if self._scorer is None:
+            with self._load_lock:
+                if self._scorer is None:
+                    self._load_locked()
+            return self._scorer
+        self._maybe_reload()
+        return self._scorer
+
+    def info(self):
+        return {
+            'directory': self.directory,
+            'version': self._version,
+            'loaded_at': self._loaded_at,
+            'load_seconds': round(self._load_seconds, 4) if self._load_seconds is not None else None,
+            'loads': self._loads,
+            'pitch_backend': self._scorer.pitch_backend if self._scorer is not None else None,
+        }
+
+
+default_registry = ModelRegistry()
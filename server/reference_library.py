@@ -0,0 +1,228 @@
+"""
+Module Name: reference_library.py
+Date: 2026-10-18
+Description:
+    Shared library of downloaded YouTube reference tracks. Entries are keyed
+    by the normalized video or clip ID, so every student practising the same
+    piece reuses one download. Concurrent requests for the same ID wait on a
+    single download instead of starting their own. Each entry keeps the
+    downloaded stream untouched, its mono float32 PCM at ANALYSIS_SR (what
+    every analysis stage reads) and its precomputed waveform and features
+    (through the feature cache). The MP3 for playback is only encoded the
+    first time a client asks for it. The least recently used entries are
+    evicted once the library grows past LIBRARY_BUDGET_BYTES.
+
+Usage:
+    library = ReferenceLibrary()
+    entry = library.get("https://youtube.com/clip/Ugkx...")
+    entry.pcm_path, entry.source_path, entry.mp3_path()
+
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlparse, parse_qs
+
+from audio_analysis import pcm_filename
+from startup import lazy_import
+
+# Only needed once something is downloaded or played
+ingest = lazy_import("ingest")
+youtube_to_mp3 = lazy_import("youtube_to_mp3")
+
+LIBRARY_ROOT = os.environ.get("TUNESYNC_LIBRARY_ROOT", "reference_library")
+LIBRARY_BUDGET_BYTES = 4 * 1024 ** 3
+AUDIO_NAME = "audio"
+SOURCE_NAME = "source"
+PCM_NAME = pcm_filename(AUDIO_NAME)
+MP3_NAME = AUDIO_NAME + ".mp3"
+
+
+def normalize_youtube_id(url):
+    """
+    Return a stable key for a YouTube URL, e.g. "video-dQw4w9WgXcQ" or
+    "clip-Ugkx...", ignoring tracking parameters like ?si=. URLs that are not
+    recognised fall back to a hash of the URL without its query string.
+    """
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower().split(":")[0]
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+    parts = [part for part in parsed.path.split("/") if part]
+
+    if host == "youtu.be" and parts:
+        return f"video-{parts[0]}"
+    if host in ("youtube.com", "music.youtube.com"):
+        video_id = parse_qs(parsed.query).get("v", [None])[0]
+        if parts[:1] == ["watch"] and video_id:
+            return f"video-{video_id}"
+        if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            return f"video-{parts[1]}"
+        if len(parts) >= 2 and parts[0] == "clip":
+            return f"clip-{parts[1]}"
+
+    stripped = f"{host}{parsed.path}".rstrip("/")
+    return "url-" + hashlib.sha256(stripped.encode()).hexdigest()[:24]
+
+
+class ReferenceEntry:
+    """Files of one library entry. The MP3 is created on first use."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.key = os.path.basename(directory)
+        self.pcm_path = os.path.join(directory, PCM_NAME)
+        self.source_path = next(
+            (os.path.join(directory, name) for name in sorted(os.listdir(directory))
+             if os.path.splitext(name)[0] == SOURCE_NAME),
+            None,
+        )
+
+    def mp3_path(self):
+        return ingest.ensure_mp3(self.source_path, os.path.join(self.directory, MP3_NAME))
+
+
+class ReferenceLibrary:
+    def __init__(self, root=LIBRARY_ROOT, budget_bytes=LIBRARY_BUDGET_BYTES, downloader=None,
+                 precompute=True):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.downloader = downloader or youtube_to_mp3.download_youtube_source
+        self.precompute = precompute
+        self.downloads = 0
+        self.hits = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def lookup(self, url):
+        """The cached ReferenceEntry for url, or None (does not download)."""
+        return self.entry(normalize_youtube_id(url))
+
+    def entry(self, key):
+        """The cached ReferenceEntry stored under key, or None."""
+        entry_dir = self._entry_dir(key)
+        if key.startswith(".") or os.sep in key or not os.path.exists(os.path.join(entry_dir, PCM_NAME)):
+            return None
+        os.utime(entry_dir)
+        return ReferenceEntry(entry_dir)
+
+    def get(self, url):
+        """Return the ReferenceEntry for url, downloading it at most once."""
+        key = normalize_youtube_id(url)
+
+        with self._lock:
+            entry = self.lookup(url)
+            if entry:
+                self.hits += 1
+                return entry
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            # Someone else is already downloading this reference
+            return future.result()
+
+        try:
+            entry = self._download(key, url)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _download(self, key, url):
+        staging = tempfile.mkdtemp(prefix=f".{key}-", dir=self.root)
+        try:
+            downloaded = self.downloader(url, output_dir=staging, name=SOURCE_NAME)
+            if not downloaded:
+                raise RuntimeError("Error downloading audio")
+            ingest.decode_to_pcm(downloaded, os.path.join(staging, AUDIO_NAME))
+
+            # Publish the finished entry in one rename; another process may have won the race
+            entry_dir = self._entry_dir(key)
+            try:
+                os.rename(staging, entry_dir)
+            except OSError:
+                if not os.path.exists(os.path.join(entry_dir, PCM_NAME)):
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        with self._lock:
+            self.downloads += 1
+        entry = ReferenceEntry(entry_dir)
+        print(f"Added {key} to the reference library")
+
+        if self.precompute:
+            self._precompute(entry.pcm_path)
+        self.evict(keep=key)
+        return entry
+
+    def _precompute(self, path):
+        # Waveform now (the caller needs it next); scoring features in the background
+        from waveform_pyramid import get_pyramid
+        from model.model import extract_performance_features
+        from model_registry import default_registry
+
+        get_pyramid(path)
+
+        def features():
+            try:
+                # Same pitch backend as the model that will score against it
+                extract_performance_features(path, default_registry.get().pitch_backend)
+            except Exception as e:
+                print(f"Precomputing features for {path} failed: {str(e)}")
+
+        threading.Thread(target=features, daemon=True).start()
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the library fits its budget."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            entry_dir = self._entry_dir(name)
+            if name.startswith(".") or name == keep or not os.path.isdir(entry_dir):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+            except OSError:
+                continue
+            total += size
+        if keep and os.path.isdir(self._entry_dir(keep)):
+            total += sum(entry.stat().st_size for entry in os.scandir(self._entry_dir(keep)) if entry.is_file())
+
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {"downloads": self.downloads, "hits": self.hits, "in_flight": len(self._inflight)}
+
+
+def link_or_copy(source, destination):
+    """Hard-link source to destination (copy across filesystems)."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+    return destination
@@ -1,8 +1,8 @@
-from model.model import PerformanceScorer  # Make sure to import the PerformanceScorer class
+from model_registry import default_registry  # Keeps the trained PerformanceScorer loaded
 
 def use_trained_model(audio_path: str):
-    # Load the trained scorer model and scaler
-    scorer = PerformanceScorer.load('trained_model')  # Path where the model and scaler are saved
+    # Get the shared scorer (model and scaler are loaded once per process)
+    scorer = default_registry.get()
     
     # Use the model to score the performance of a new audio file
     score, confidence = scorer.score_performance(audio_path)
@@ -13,4 +13,32 @@ def use_trained_model(audio_path: str):
 
     return score
 
+def extract_feature_row(audio_path: str):
+    # One file's features in the model's column order; the server fans these out to the analysis workers
+    from model.model import FEATURE_NAMES, extract_performance_features
+    features = extract_performance_features(audio_path, default_registry.get().pitch_backend)
+    return [features[name] for name in FEATURE_NAMES]
+
+def score_feature_rows(rows: list):
+    # Score all rows in one matrix call; None rows (failed extraction) stay None
+    scorer = default_registry.get()
+    kept = [i for i, row in enumerate(rows) if row is not None]
+    results = [None] * len(rows)
+    if kept:
+        for i, metrics in zip(kept, scorer.score_features([rows[i] for i in kept])):
+            results[i] = metrics
+
+    print(f"Scored {len(kept)}/{len(rows)} performances")
+    return results
+
+def use_trained_model_batch(audio_paths: list, workers: int = None):
+    # Offline use: features for all files are extracted in parallel, then scored in one matrix call
+    scorer = default_registry.get()
+    results = scorer.score_batch(audio_paths, workers=workers)
+
+    scored = [r for r in results if r is not None]
+    print(f"Scored {len(scored)}/{len(audio_paths)} performances")
+
+    return results
+
 # use_trained_model('./uploads/recording.wav')
@@ -0,0 +1,192 @@
+"""
+Module Name: startup.py
+Date: 2026-10-18
+Description:
+    Cold-start controls for the server.
+
+    TUNESYNC_STARTUP=lazy: app.py imports the analysis modules (librosa,
+    scipy, sklearn, yt_dlp, google.genai behind them) through lazy_import,
+    so nothing heavy is imported until the first request that uses it and the
+    model is loaded on first use. The default, "eager", imports everything
+    and loads the model before serving, as before.
+
+    TUNESYNC_WARMUP=1 (default): once the app is imported, a background thread
+    imports the analysis stack and runs it on a short synthetic clip, so numba
+    kernels are compiled and the model is loaded before the first real request.
+
+    TUNESYNC_ANALYSIS_WORKERS=N: N worker processes are forked at startup and
+    warm up the same way; run_analysis() hands CPU-heavy calls to them. The
+    server process then only imports in the background, so it does not
+    compete with the workers for CPU. Stage metrics recorded inside the
+    workers stay in the workers.
+
+Usage:
+    waveform = lazy_import("waveform")        # module proxy, imported on first use
+    start_analysis_pool()
+    start_background_warm_up()
+    data = run_analysis("waveform.generate_waveform", path)
+    futures = [submit_analysis("scorepiece.extract_feature_row", path) for path in paths]
+
+"""
+
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+STARTUP_MODE = os.environ.get("TUNESYNC_STARTUP", "eager")
+WARMUP = os.environ.get("TUNESYNC_WARMUP", "1") == "1"
+ANALYSIS_WORKERS = int(os.environ.get("TUNESYNC_ANALYSIS_WORKERS", "0"))
+
+# Imported by warm_up; together they pull in the whole analysis stack
+HEAVY_MODULES = (
+    "audio_analysis", "waveform", "waveform_pyramid", "match", "alignment", "discrepancies",
+    "model_registry", "scorepiece", "generate_advice", "google.genai", "youtube_to_mp3", "ingest", "live",
+)
+
+WARMUP_SECONDS = 3.0
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is first used."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+
+    def __getattr__(self, attribute):
+        # import_module is thread-safe, and after the first call just a sys.modules lookup
+        return getattr(importlib.import_module(self._name), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_import(name):
+    """The module itself in eager mode, a LazyModule proxy in lazy mode."""
+    if STARTUP_MODE == "lazy":
+        return LazyModule(name)
+    return importlib.import_module(name)
+
+
+def _synthetic_clip(sr, seconds=WARMUP_SECONDS):
+    # A few decaying tones with clear onsets, so onset and beat tracking have something to find
+    t = np.arange(int(sr * 0.25)) / sr
+    notes = [np.sin(2 * np.pi * frequency * t) * np.exp(-6 * t) for frequency in (262.0, 330.0, 392.0, 523.0)]
+    y = np.concatenate(notes * int(np.ceil(seconds / (len(notes) * 0.25))))
+    return (0.3 * y[:int(sr * seconds)]).astype(np.float32)
+
+
+def warm_up(run_clip=True):
+    """
+    Import the analysis stack, load the model and (with run_clip) run the
+    analysis once on a synthetic clip held in memory, so imports, numba
+    compilation and the model load are paid here instead of by the first
+    request. Nothing is written to the caches.
+    """
+    start = time.perf_counter()
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    from model_registry import default_registry
+    scorer = default_registry.get()
+    if not run_clip:
+        print(f"Imports finished in {time.perf_counter() - start:.2f}s (pid {os.getpid()})")
+        return
+
+    from scipy.ndimage import gaussian_filter1d
+    from audio_analysis import AudioAnalysis, ANALYSIS_SR
+    from alignment import estimate_offset
+    from model.model import FEATURE_NAMES, extract_performance_features
+    from waveform import SIGMA
+
+    y = _synthetic_clip(ANALYSIS_SR)
+    reference = AudioAnalysis(y, ANALYSIS_SR)
+    student = AudioAnalysis(np.roll(y, ANALYSIS_SR // 10), ANALYSIS_SR)
+    gaussian_filter1d(reference.rms(), sigma=SIGMA)
+    features = extract_performance_features(reference)
+    estimate_offset(reference, student)
+    scorer.score_features([[features[name] for name in FEATURE_NAMES]])
+
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s (pid {os.getpid()})")
+
+
+def start_background_warm_up(run_clip=True):
+    thread = threading.Thread(target=warm_up, args=(run_clip,), daemon=True, name="warm-up")
+    thread.start()
+    return thread
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _call(qualified_name, args, kwargs):
+    module_name, function_name = qualified_name.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), function_name)(*args, **kwargs)
+
+
+_pool = None
+
+
+def start_analysis_pool(workers=ANALYSIS_WORKERS):
+    """
+    Fork workers processes that warm up before taking work. Call it before the
+    server starts any threads; without fork (Windows, macOS default) or with
+    workers=0 run_analysis() stays in-process.
+    """
+    global _pool
+    if workers <= 0 or _pool is not None:
+        return None
+    if "fork" not in multiprocessing.get_all_start_methods():
+        print("Analysis workers need fork; running analysis in the server process")
+        return None
+
+    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                initializer=warm_up)
+    # With fork, all workers are started by the first submit, i.e. right now
+    for _ in range(workers):
+        _pool.submit(_worker_ready)
+    print(f"Started {workers} analysis workers")
+    return _pool
+
+
+def submit_analysis(qualified_name, *args, **kwargs):
+    """
+    Like run_analysis, but returns a Future so several calls can run on the
+    workers at once. Without a pool the call runs here, before returning.
+    """
+    if _pool is not None:
+        try:
+            return _pool.submit(_call, qualified_name, args, kwargs)
+        except BrokenProcessPool:
+            _pool_broken()
+    future = Future()
+    try:
+        future.set_result(_call(qualified_name, args, kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _pool_broken():
+    global _pool
+    print("Analysis workers died; running analysis in the server process from now on")
+    _pool = None
+
+
+def run_analysis(qualified_name, *args, **kwargs):
+    """
+    Call "module.function"(*args, **kwargs) in a warm worker when there is a
+    pool, else in this process. Only the name is sent, so the server never
+    has to import the module to hand the work off.
+    """
+    if _pool is not None:
+        try:
+            return _pool.submit(_call, qualified_name, args, kwargs).result()
+        except BrokenProcessPool:
+            _pool_broken()
+    return _call(qualified_name, args, kwargs)
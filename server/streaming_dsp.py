@@ -0,0 +1,167 @@
+"""
+Module Name: streaming_dsp.py
+Date: 2026-10-18
+Description:
+    Incremental versions of the RMS framing and Gaussian smoothing used by
+    waveform.py. Samples are pushed in blocks of any size; each stage carries
+    just enough state across block boundaries (a partial frame, the last
+    2 * radius RMS values) that the output matches the whole-signal
+    librosa.feature.rms / gaussian_filter1d results. StreamingOnsetStrength
+    does the same for the onset envelope used by alignment.py (the dB floor
+    follows the running maximum, so very quiet frames can differ).
+
+Usage:
+    rms = StreamingRMS(frame_length=2048, hop_length=512)
+    smoother = StreamingGaussian(sigma=5)
+    for block in blocks:
+        smoothed = smoother.push(rms.push(block))
+    smoothed = smoother.finish(rms.finish())
+
+"""
+
+import numpy as np
+import librosa
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.ndimage import gaussian_filter1d
+from scipy.signal import get_window
+
+
+class StreamingRMS:
+    """
+    Frame-by-frame RMS matching librosa.feature.rms(y=..., center=True),
+    including the zero padding of frame_length // 2 on both ends.
+    """
+
+    def __init__(self, frame_length=2048, hop_length=512):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.frames_emitted = 0
+        self._buffer = np.zeros(frame_length // 2, dtype=np.float32)
+
+    def _emit(self):
+        available = len(self._buffer) - self.frame_length
+        if available < 0:
+            return np.zeros(0, dtype=np.float32)
+        n_frames = 1 + available // self.hop_length
+        frames = sliding_window_view(self._buffer, self.frame_length)[::self.hop_length][:n_frames]
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        self._buffer = self._buffer[n_frames * self.hop_length:]
+        self.frames_emitted += n_frames
+        return rms
+
+    def push(self, samples):
+        self._buffer = np.concatenate((self._buffer, np.asarray(samples, dtype=np.float32)))
+        return self._emit()
+
+    def finish(self):
+        self._buffer = np.concatenate(
+            (self._buffer, np.zeros(self.frame_length // 2, dtype=np.float32))
+        )
+        return self._emit()
+
+
+class StreamingGaussian:
+    """
+    gaussian_filter1d(x, sigma) (mode='reflect', truncate=4.0) computed on a
+    stream. Output lags the input by `radius` values, which are released once
+    their right-hand context has arrived or finish() is called.
+    """
+
+    def __init__(self, sigma=5, truncate=4.0):
+        self.sigma = sigma
+        self.radius = int(truncate * sigma + 0.5)
+        x = np.arange(-self.radius, self.radius + 1)
+        weights = np.exp(-0.5 / (sigma * sigma) * x ** 2)
+        self.weights = weights / weights.sum()
+        self._buffer = np.zeros(0)
+        self._started = False
+
+    def push(self, values):
+        self._buffer = np.concatenate((self._buffer, np.asarray(values, dtype=np.float64)))
+
+        if not self._started:
+            # Wait for enough samples to reflect the left edge like scipy does
+            if len(self._buffer) <= 2 * self.radius:
+                return np.zeros(0)
+            left = self._buffer[:self.radius][::-1]
+            self._buffer = np.concatenate((left, self._buffer))
+            self._started = True
+
+        if len(self._buffer) <= 2 * self.radius:
+            return np.zeros(0)
+        smoothed = np.convolve(self._buffer, self.weights, mode='valid')
+        self._buffer = self._buffer[-2 * self.radius:]
+        return smoothed
+
+    def finish(self, values=()):
+        tail = self.push(values)
+        if not self._started:
+            # Signal shorter than the kernel: filter it in one go
+            smoothed = gaussian_filter1d(self._buffer, sigma=self.sigma) if len(self._buffer) else self._buffer
+            self._buffer = np.zeros(0)
+            return smoothed
+
+        right = self._buffer[-self.radius:][::-1]
+        smoothed = np.convolve(np.concatenate((self._buffer, right)), self.weights, mode='valid')
+        self._buffer = np.zeros(0)
+        return np.concatenate((tail, smoothed))
+
+
+class StreamingOnsetStrength:
+    """
+    librosa.onset.onset_strength of a mel dB spectrogram (center=True,
+    lag=1, mean over mel bands) computed on a stream of samples. The
+    top_db floor is relative to the loudest frame so far; pass initial_max_db
+    (e.g. from a similar recording) to avoid a too-low floor at the start.
+    """
+
+    def __init__(self, sr, n_fft=2048, hop_length=512, n_mels=128, top_db=80.0, initial_max_db=-np.inf):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.top_db = top_db
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+        self.window = get_window('hann', n_fft, fftbins=True)
+        self.frames_emitted = 0
+        self._frames_seen = 0
+        self._buffer = np.zeros(n_fft // 2, dtype=np.float32)
+        self._previous = None
+        self._max_db = initial_max_db
+        # librosa pads the envelope with lag + n_fft // (2 * hop) zeros when centered
+        self._pending = [np.zeros(1 + n_fft // (2 * hop_length))]
+
+    def _frames(self):
+        available = len(self._buffer) - self.n_fft
+        if available < 0:
+            return
+        n_frames = 1 + available // self.hop_length
+        frames = sliding_window_view(self._buffer, self.n_fft)[::self.hop_length][:n_frames]
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        mel_db = 10.0 * np.log10(np.maximum(1e-10, power @ self.mel_basis.T))
+        self._max_db = max(self._max_db, float(mel_db.max()))
+        mel_db = np.maximum(mel_db, self._max_db - self.top_db)
+        self._buffer = self._buffer[n_frames * self.hop_length:]
+        self._frames_seen += n_frames
+
+        if self._previous is not None:
+            mel_db = np.vstack((self._previous, mel_db))
+        self._previous = mel_db[-1]
+        if len(mel_db) > 1:
+            self._pending.append(np.mean(np.maximum(0.0, np.diff(mel_db, axis=0)), axis=1))
+
+    def _emit(self):
+        # The envelope has one value per STFT frame; the padding runs ahead of the frames
+        pending = np.concatenate(self._pending)
+        n = max(0, self._frames_seen - self.frames_emitted)
+        self._pending = [pending[n:]]
+        self.frames_emitted += min(n, len(pending))
+        return pending[:n]
+
+    def push(self, samples):
+        self._buffer = np.concatenate((self._buffer, np.asarray(samples, dtype=np.float32)))
+        self._frames()
+        return self._emit()
+
+    def finish(self):
+        self._buffer = np.concatenate((self._buffer, np.zeros(self.n_fft // 2, dtype=np.float32)))
+        self._frames()
+        return self._emit()
@@ -0,0 +1,88 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from generate_advice import GeminiAdvisor, MissingApiKeyError
+
+
+class FakeClient:
+    """Stands in for genai.Client: counts uploads and generate_content calls."""
+
+    def __init__(self):
+        self.uploaded = []
+        self.prompts = 0
+        self._lock = threading.Lock()
+        self.files = SimpleNamespace(upload=self._upload)
+        self.models = SimpleNamespace(generate_content=self._generate_content)
+
+    def _upload(self, file):
+        with self._lock:
+            self.uploaded.append(file)
+        return SimpleNamespace(name=f"files/{len(self.uploaded)}", expiration_time=None)
+
+    def _generate_content(self, model, contents):
+        self.prompts += 1
+        names = ", ".join(part.name for part in contents[1:])
+        return SimpleNamespace(text=f"1) Timestamp: 1.0 seconds;\nDiscrepancy: {names};\nSuggestion: Slow down;")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("API_KEY", "test-key")
+    return FakeClient()
+
+
+@pytest.fixture
+def audio_files(tmp_path):
+    paths = {}
+    for name, content in (("reference", b"reference audio"), ("take1", b"first take"), ("take2", b"second take")):
+        path = tmp_path / f"{name}.wav"
+        path.write_bytes(content)
+        paths[name] = str(path)
+    return paths
+
+
+def test_advice_is_cached(client, audio_files):
+    advisor = GeminiAdvisor(client_factory=lambda api_key: client)
+
+    first = advisor.advise(audio_files["reference"], audio_files["take1"])
+    second = advisor.advise(audio_files["reference"], audio_files["take1"])
+
+    assert first == second
+    assert client.prompts == 1
+    assert len(client.uploaded) == 2
+    assert advisor.stats()["advice_hits"] == 1
+
+
+def test_uploads_are_reused_by_content(client, audio_files, tmp_path):
+    advisor = GeminiAdvisor(client_factory=lambda api_key: client)
+
+    advisor.advise(audio_files["reference"], audio_files["take1"])
+    # Same reference bytes under another name: only the new take is uploaded
+    copy = tmp_path / "reference-copy.wav"
+    copy.write_bytes(b"reference audio")
+    advisor.advise(str(copy), audio_files["take2"])
+
+    assert client.prompts == 2
+    assert sorted(client.uploaded) == sorted([audio_files["reference"], audio_files["take1"], audio_files["take2"]])
+    assert advisor.stats()["upload_hits"] == 1
+
+
+def test_expired_uploads_are_sent_again(client, audio_files):
+    advisor = GeminiAdvisor(client_factory=lambda api_key: client, upload_ttl=0)
+
+    advisor.upload(audio_files["reference"])
+    advisor.upload(audio_files["reference"])
+
+    assert len(client.uploaded) == 2
+    assert advisor.stats()["upload_hits"] == 0
+
+
+def test_missing_api_key(monkeypatch, audio_files):
+    monkeypatch.setenv("API_KEY", "")
+    monkeypatch.setattr("generate_advice.load_dotenv", lambda: None)
+    advisor = GeminiAdvisor(client_factory=lambda api_key: FakeClient())
+
+    with pytest.raises(MissingApiKeyError):
+        advisor.advise(audio_files["reference"], audio_files["take1"])
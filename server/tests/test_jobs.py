@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from jobs import JobRunner, MemoryJobStore, SQLiteJobStore, QueueFullError, DONE, FAILED
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+
+@pytest.fixture
+def runner(store):
+    runner = JobRunner(store, max_workers=2)
+    yield runner
+    runner.shutdown()
+
+
+def test_job_runs_to_completion(runner):
+    stages = []
+
+    def work(report):
+        for stage in ("download", "scoring"):
+            report(stage)
+            stages.append(stage)
+        return {"score": 87.5, "advice": "Play softer"}
+
+    job_id = runner.submit("compare_audio", work)
+    job = runner.wait(job_id, timeout=5)
+
+    assert job["status"] == DONE
+    assert job["kind"] == "compare_audio"
+    assert job["stage"] is None
+    assert job["result"] == {"score": 87.5, "advice": "Play softer"}
+    assert stages == ["download", "scoring"]
+
+
+def test_failed_job_records_error(runner):
+    def work(report):
+        report("download")
+        raise RuntimeError("Error downloading audio")
+
+    job = runner.wait(runner.submit("process_youtube", work), timeout=5)
+
+    assert job["status"] == FAILED
+    assert job["error"] == "Error downloading audio"
+    assert job["result"] is None
+
+
+def test_events_follow_stage_changes(runner):
+    release = threading.Event()
+
+    def work(report):
+        report("waveform")
+        release.wait(5)
+        return "ok"
+
+    job_id = runner.submit("upload", work)
+    events = runner.events(job_id, poll_interval=0.01)
+    seen = [next(events)]
+    while seen[-1]["stage"] != "waveform":
+        seen.append(next(events))
+    release.set()
+    seen.extend(events)
+
+    assert seen[-1]["status"] == DONE
+    assert seen[-1]["result"] == "ok"
+
+
+def test_queue_limit(store):
+    runner = JobRunner(store, max_workers=1, queue_limit=1)
+    release = threading.Event()
+    try:
+        job_id = runner.submit("compare_audio", lambda report: release.wait(5))
+        with pytest.raises(QueueFullError):
+            runner.submit("compare_audio", lambda report: None)
+    finally:
+        release.set()
+        runner.wait(job_id, timeout=5)
+        runner.shutdown()
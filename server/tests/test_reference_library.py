@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from reference_library import ReferenceLibrary, normalize_youtube_id
+
+CLIP_URL = "https://youtube.com/clip/UgkxQGPOYrsPQ8PrsAx9mYhpfDGm3GiYhVxi?si=KRC8xS83fLtrc2Qm"
+
+
+class StubDownloader:
+    """Writes a short tone instead of calling yt_dlp; counts the downloads."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, output_dir="audio_files", name="source"):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)  # keeps the download in flight while the other requests arrive
+        sr = 22050
+        path = os.path.join(output_dir, name + ".wav")
+        sf.write(path, 0.3 * np.sin(2 * np.pi * 440 * np.arange(sr) / sr), sr)
+        return path
+
+
+@pytest.fixture
+def downloader():
+    return StubDownloader()
+
+
+@pytest.fixture
+def library(tmp_path, downloader):
+    return ReferenceLibrary(root=str(tmp_path / "library"), downloader=downloader, precompute=False)
+
+
+def test_concurrent_requests_download_once(library, downloader):
+    # Different tracking parameters, same clip
+    urls = [f"{CLIP_URL.split('?')[0]}?si=request{i}" for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        entries = list(pool.map(library.get, urls))
+
+    assert downloader.calls == 1
+    assert library.downloads == 1
+    assert len({entry.directory for entry in entries}) == 1
+    assert os.path.exists(entries[0].pcm_path)
+    assert os.path.splitext(entries[0].source_path)[1] == ".wav"
+
+
+def test_cached_entry_is_reused(library, downloader):
+    first = library.get(CLIP_URL)
+    second = library.get(CLIP_URL)
+
+    assert downloader.calls == 1
+    assert library.hits == 1
+    assert second.directory == first.directory
+    assert library.lookup(CLIP_URL).key == normalize_youtube_id(CLIP_URL)
+
+
+def test_failed_download_is_reported_to_every_waiter(tmp_path):
+    def failing(url, output_dir, name):
+        time.sleep(0.2)
+        return None
+
+    library = ReferenceLibrary(root=str(tmp_path / "library"), downloader=failing, precompute=False)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(library.get, CLIP_URL) for _ in range(4)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="Error downloading audio"):
+            future.result()
+    assert library.lookup(CLIP_URL) is None
+
+
+@pytest.mark.parametrize("url, key", [
+    ("https://www.youtube.com/watch?v=CRQ9lFZK3kg&si=abc", "video-CRQ9lFZK3kg"),
+    ("https://youtu.be/CRQ9lFZK3kg?t=10", "video-CRQ9lFZK3kg"),
+    ("https://youtube.com/shorts/CRQ9lFZK3kg", "video-CRQ9lFZK3kg"),
+    (CLIP_URL, "clip-UgkxQGPOYrsPQ8PrsAx9mYhpfDGm3GiYhVxi"),
+])
+def test_normalize_youtube_id(url, key):
+    assert normalize_youtube_id(url) == key
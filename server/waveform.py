@@ -12,34 +12,124 @@ Usage:
 
 import numpy as np
 import librosa
-import librosa.display
-import matplotlib.pyplot as plt
 from scipy.ndimage import gaussian_filter1d
-import io
-import base64
+import soundfile as sf
+from audio_analysis import get_analysis
+from feature_cache import cached_analysis
+from instrumentation import stage
+from streaming_dsp import StreamingRMS, StreamingGaussian
 
-def generate_waveform(audio_file):
+# Analysis parameters (also part of the feature cache key)
+FRAME_LENGTH = 2048  # Adjust for resolution
+HOP_LENGTH = 512   # Increase for more smoothness
+SIGMA = 5  # adjust sigma here
+
+# Files longer than this are read block by block instead of decoded whole
+STREAMING_MIN_SECONDS = 120
+STREAM_BLOCK_SIZE = 262144  # samples per block read
+
+def _stream_duration(audio_file):
+    """Duration in seconds if soundfile can block-read the file, else None"""
+    try:
+        return sf.info(audio_file).duration
+    except Exception:
+        return None
+
+def stream_dynamics(audio_file, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, sigma=SIGMA,
+                    block_size=STREAM_BLOCK_SIZE):
     """
-    This function will generate waveform data from an audio file.
-    It will return the data as a list and an optional plot image in base64 format.
+    Read the file in blocks and yield (rms, smoothed_rms) arrays as soon as
+    they are available. Peak memory is one block plus the filter state.
+    smoothed_rms lags rms by the Gaussian radius and catches up at the end.
     """
-    # Load audio file
-    y, sr = librosa.load(audio_file, sr=None)
+    rms_stream = StreamingRMS(frame_length=frame_length, hop_length=hop_length)
+    smoother = StreamingGaussian(sigma=sigma)
 
-    # Step 1: Compute loudness using RMS (Root Mean Square)
-    frame_length = 2048  # Adjust for resolution
-    hop_length = 512   # Increase for more smoothness
-    rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
+    for block in sf.blocks(audio_file, blocksize=block_size, dtype='float32', always_2d=True):
+        # Downmix to mono the same way librosa.load does
+        rms = rms_stream.push(block.mean(axis=1))
+        yield rms, smoother.push(rms)
 
-    # Step 2: Normalize the loudness from 0 (p) to 1 (f)
-    rms_min, rms_max = np.min(rms), np.max(rms)
-    normalized_loudness = (rms - rms_min) / (rms_max - rms_min)
+    rms = rms_stream.finish()
+    yield rms, smoother.finish(rms)
 
-    # Step 3: Smooth the curve using a Gaussian filter (adjust sigma for smoothness)
-    smoothed_loudness = gaussian_filter1d(normalized_loudness, sigma=5) # adjust sigma here
+def compute_dynamics_streaming(audio_file, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, sigma=SIGMA,
+                               block_size=STREAM_BLOCK_SIZE):
+    """
+    Same output as compute_dynamics, computed without loading the whole file.
+    Normalization is applied after smoothing, which is equivalent because the
+    Gaussian filter is linear and its weights sum to one.
+    """
+    rms_min, rms_max = np.inf, -np.inf
+    smoothed_blocks = []
+    for rms, smoothed in stream_dynamics(audio_file, frame_length, hop_length, sigma, block_size):
+        if len(rms):
+            rms_min = min(rms_min, float(np.min(rms)))
+            rms_max = max(rms_max, float(np.max(rms)))
+        smoothed_blocks.append(smoothed)
+
+    smoothed_loudness = (np.concatenate(smoothed_blocks) - rms_min) / (rms_max - rms_min)
+    info = sf.info(audio_file)
+    times = librosa.frames_to_time(np.arange(len(smoothed_loudness)), sr=info.samplerate, hop_length=hop_length)
+
+    return {
+        "times": times,
+        "dynamics": smoothed_loudness,
+        "sr": info.samplerate,
+        "duration": info.frames / info.samplerate,
+    }
+
+def compute_dynamics(audio_file, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, sigma=SIGMA, streaming=None):
+    """
+    Compute the smoothed, normalized loudness curve of an audio file.
+    Returns a dict with "times" and "dynamics" arrays plus "sr" and "duration".
+    Long files (or streaming=True) are processed in blocks with bounded memory.
+    Results are cached on disk by audio content and parameters.
+    """
+    if streaming is None:
+        duration = _stream_duration(audio_file)
+        streaming = duration is not None and duration >= STREAMING_MIN_SECONDS
 
-    # Step 4: Time axis (convert frames to seconds)
-    times = librosa.times_like(rms, sr=sr, hop_length=hop_length)
+    def compute():
+        if streaming:
+            with stage("dynamics_streaming"):
+                return compute_dynamics_streaming(audio_file, frame_length, hop_length, sigma)
+
+        # Load audio file (decoded once and shared with alignment and scoring)
+        analysis = get_analysis(audio_file)
+        sr = analysis.sr
+
+        # Step 1: Compute loudness using RMS (Root Mean Square)
+        rms = analysis.rms(frame_length=frame_length, hop_length=hop_length)
+
+        # Step 2: Normalize the loudness from 0 (p) to 1 (f)
+        rms_min, rms_max = np.min(rms), np.max(rms)
+        normalized_loudness = (rms - rms_min) / (rms_max - rms_min)
+
+        # Step 3: Smooth the curve using a Gaussian filter (adjust sigma for smoothness)
+        with stage("smoothing"):
+            smoothed_loudness = gaussian_filter1d(normalized_loudness, sigma=sigma)
+
+        # Step 4: Time axis (convert frames to seconds)
+        times = librosa.times_like(rms, sr=sr, hop_length=hop_length)
+
+        return {
+            "times": times,
+            "dynamics": smoothed_loudness,
+            "sr": sr,
+            "duration": analysis.duration,
+        }
+
+    params = {"frame_length": frame_length, "hop_length": hop_length, "sigma": sigma}
+    return cached_analysis(audio_file, "waveform", params, compute)
+
+def generate_waveform(audio_file):
+    """
+    This function will generate waveform data from an audio file.
+    It will return the data as a list and an optional plot image in base64 format.
+    """
+    data = compute_dynamics(audio_file)
+    times, smoothed_loudness = data["times"], data["dynamics"]
 
     # plot for debugging
     # plt.figure(figsize=(10, 4))
@@ -52,7 +142,7 @@ def generate_waveform(audio_file):
     # plt.grid()
     # plt.show()
 
-    duration = librosa.get_duration(y=y, sr=sr)
+    duration = data["duration"]
     print(f"Audio duration: {duration} seconds")
 
     times = [round(t, 1) if isinstance(t, float) else float(t) for t in times]
@@ -63,4 +153,3 @@ def generate_waveform(audio_file):
     }
 
     return response_data
-
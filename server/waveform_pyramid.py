@@ -0,0 +1,134 @@
+"""
+Module Name: waveform_pyramid.py
+Date: 2026-10-18
+Description:
+    Multi-resolution min/max/mean pyramid over the dynamics curve from
+    waveform.compute_dynamics. Level 0 is the full-resolution curve (one point
+    per hop); each further level merges FACTOR bins of the previous one.
+    Range queries pick the finest level that still fits the requested pixel
+    width and return at most `width` points, regardless of track length.
+
+Usage:
+    pyramid = get_pyramid(path)
+    view = query_pyramid(pyramid, start=30.0, end=60.0, width=800)
+
+"""
+
+import numpy as np
+
+from feature_cache import cached_analysis
+from waveform import compute_dynamics, FRAME_LENGTH, HOP_LENGTH, SIGMA
+
+FACTOR = 4
+MIN_LEVEL_BINS = 64  # stop adding levels once a level is this small
+MAX_WIDTH = 4096
+
+
+def build_pyramid(dynamics, factor=FACTOR, min_level_bins=MIN_LEVEL_BINS):
+    """
+    Return a list of levels, each a dict of "min", "max", "mean" and "count"
+    arrays. "count" is the number of full-resolution points in each bin.
+    """
+    dynamics = np.asarray(dynamics, dtype=np.float32)
+    levels = [{
+        "min": dynamics,
+        "max": dynamics,
+        "mean": dynamics,
+        "count": np.ones(len(dynamics), dtype=np.int64),
+    }]
+
+    while len(levels[-1]["mean"]) > min_level_bins:
+        prev = levels[-1]
+        edges = np.arange(0, len(prev["mean"]), factor)
+        count = np.add.reduceat(prev["count"], edges)
+        levels.append({
+            "min": np.minimum.reduceat(prev["min"], edges),
+            "max": np.maximum.reduceat(prev["max"], edges),
+            "mean": (np.add.reduceat(prev["mean"] * prev["count"], edges) / count).astype(np.float32),
+            "count": count,
+        })
+
+    return levels
+
+
+def get_pyramid(audio_file, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, sigma=SIGMA, factor=FACTOR):
+    """
+    Build (or load from the feature cache) the pyramid for an audio file.
+    Returns a dict with "levels", "factor" and "seconds_per_point".
+    """
+    def compute():
+        data = compute_dynamics(audio_file, frame_length, hop_length, sigma)
+        entry = {
+            "factor": factor,
+            "n_levels": 0,
+            "seconds_per_point": hop_length / data["sr"],
+            "duration": data["duration"],
+        }
+        for i, level in enumerate(build_pyramid(data["dynamics"], factor)):
+            for name, values in level.items():
+                entry[f"level{i}_{name}"] = values
+            entry["n_levels"] = i + 1
+        return entry
+
+    params = {"frame_length": frame_length, "hop_length": hop_length, "sigma": sigma, "factor": factor}
+    entry = cached_analysis(audio_file, "pyramid", params, compute)
+
+    levels = [
+        {name: entry[f"level{i}_{name}"] for name in ("min", "max", "mean", "count")}
+        for i in range(int(entry["n_levels"]))
+    ]
+    return {
+        "levels": levels,
+        "factor": int(entry["factor"]),
+        "seconds_per_point": float(entry["seconds_per_point"]),
+        "duration": float(entry["duration"]),
+    }
+
+
+def query_pyramid(pyramid, start=0.0, end=None, width=800):
+    """
+    Return min/max/mean dynamics for [start, end) seconds in at most `width`
+    points, plus the start time of each point.
+    """
+    width = max(1, min(int(width), MAX_WIDTH))
+    factor = pyramid["factor"]
+    seconds_per_point = pyramid["seconds_per_point"]
+    n_points = len(pyramid["levels"][0]["mean"])
+
+    first = max(0, int(np.floor(start / seconds_per_point)))
+    last = n_points if end is None else min(n_points, int(np.ceil(end / seconds_per_point)))
+    if last <= first:
+        return {"start": start, "end": end, "times": [], "min": [], "max": [], "mean": []}
+
+    # Finest level where the range spans no more than factor * width bins
+    level_index = 0
+    while (level_index + 1 < len(pyramid["levels"])
+           and (last - first) // factor ** level_index > factor * width):
+        level_index += 1
+    level = pyramid["levels"][level_index]
+    scale = factor ** level_index
+
+    lo = first // scale
+    hi = min(len(level["mean"]), -(-last // scale))
+    n_bins = hi - lo
+
+    if n_bins <= width:
+        edges = np.arange(n_bins)
+    else:
+        edges = (np.arange(width) * n_bins) // width
+
+    count = np.add.reduceat(level["count"][lo:hi], edges)
+    mins = np.minimum.reduceat(level["min"][lo:hi], edges)
+    maxs = np.maximum.reduceat(level["max"][lo:hi], edges)
+    means = np.add.reduceat(level["mean"][lo:hi] * level["count"][lo:hi], edges) / count
+    times = (lo + edges) * scale * seconds_per_point
+
+    return {
+        "start": float(lo * scale * seconds_per_point),
+        "end": float(hi * scale * seconds_per_point),
+        "level": level_index,
+        "times": np.round(times, 3).tolist(),
+        "min": mins.tolist(),
+        "max": maxs.tolist(),
+        "mean": means.tolist(),
+    }
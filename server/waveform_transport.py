@@ -0,0 +1,73 @@
+"""
+Module Name: waveform_transport.py
+Date: 2026-10-18
+Description:
+    Compact binary encoding of the dynamics curve for the waveform endpoints.
+    Instead of JSON lists of times and floats, the body is a raw little-endian
+    buffer (float32, or uint8/uint16 quantized with a scale and offset) and the
+    time axis is described by sample rate, hop length and start offset headers:
+        time[i] = start + i * hop_length / sr
+        value[i] = offset + q[i] * scale          (quantized encodings)
+
+Usage:
+    body, headers = encode_dynamics(dynamics, sr, hop_length, encoding="uint8")
+    dynamics = decode_dynamics(body, headers)
+
+"""
+
+import numpy as np
+
+BINARY_MIMETYPE = "application/octet-stream"
+ENCODINGS = {
+    "float32": np.dtype("<f4"),
+    "uint16": np.dtype("<u2"),
+    "uint8": np.dtype("u1"),
+}
+DEFAULT_ENCODING = "float32"
+
+
+def encode_dynamics(dynamics, sr, hop_length, start=0.0, encoding=DEFAULT_ENCODING):
+    """
+    Return (body bytes, headers dict) for a dynamics array.
+    Raises ValueError for an unknown encoding.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown waveform encoding: {encoding}")
+    dtype = ENCODINGS[encoding]
+    dynamics = np.asarray(dynamics, dtype=np.float32)
+
+    headers = {
+        "X-Waveform-Encoding": encoding,
+        "X-Waveform-Count": str(len(dynamics)),
+        "X-Waveform-Sr": str(int(sr)),
+        "X-Waveform-Hop-Length": str(int(hop_length)),
+        "X-Waveform-Start": repr(float(start)),
+    }
+
+    if encoding == "float32":
+        return dynamics.astype(dtype, copy=False).tobytes(), headers
+
+    # Quantize onto the full integer range between the curve's min and max
+    levels = np.iinfo(dtype).max
+    offset = float(dynamics.min()) if len(dynamics) else 0.0
+    span = float(dynamics.max()) - offset if len(dynamics) else 0.0
+    scale = span / levels if span > 0 else 1.0
+    quantized = np.rint((dynamics - offset) / scale).clip(0, levels).astype(dtype)
+
+    headers["X-Waveform-Scale"] = repr(scale)
+    headers["X-Waveform-Offset"] = repr(offset)
+    return quantized.tobytes(), headers
+
+
+def decode_dynamics(body, headers):
+    """Inverse of encode_dynamics; returns (times, dynamics) float arrays."""
+    encoding = headers["X-Waveform-Encoding"]
+    values = np.frombuffer(body, dtype=ENCODINGS[encoding])
+    if encoding == "float32":
+        dynamics = values.astype(np.float32)
+    else:
+        dynamics = float(headers["X-Waveform-Offset"]) + values * float(headers["X-Waveform-Scale"])
+
+    step = int(headers["X-Waveform-Hop-Length"]) / int(headers["X-Waveform-Sr"])
+    times = float(headers["X-Waveform-Start"]) + np.arange(len(dynamics)) * step
+    return times, dynamics
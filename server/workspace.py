@@ -0,0 +1,168 @@
+"""
+Module Name: workspace.py
+Date: 2026-10-18
+Description:
+    Per-session storage so concurrent users never share files. Each session
+    gets its own directory under WORKSPACE_ROOT holding its reference track
+    and recording; endpoints pass the session ID instead of relying on fixed
+    paths like uploads/recording.wav. A background thread deletes sessions
+    that have been idle longer than SESSION_TTL and, when the total size is
+    over WORKSPACE_QUOTA_BYTES, the least recently used sessions first.
+
+Usage:
+    session = workspaces.create()
+    path = session.file_path("reference", ".mp3")
+    session = workspaces.get(session_id)   # None if unknown or expired
+
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+WORKSPACE_ROOT = os.environ.get("TUNESYNC_WORKSPACE_ROOT", "workspaces")
+SESSION_TTL = 2 * 3600  # seconds a session may sit idle before it is deleted
+WORKSPACE_QUOTA_BYTES = 2 * 1024 ** 3
+CLEANUP_INTERVAL = 300
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+_META_FILE = "session.json"
+
+
+class Session:
+    """One session directory plus a small JSON index of its named files."""
+
+    def __init__(self, session_id, directory):
+        self.id = session_id
+        self.directory = directory
+
+    def _meta_path(self):
+        return os.path.join(self.directory, _META_FILE)
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def touch(self):
+        os.utime(self.directory)
+
+    def file_path(self, role, extension):
+        """Path to store the file for `role` ("reference", "recording", ...)."""
+        return os.path.join(self.directory, f"{role}{extension}")
+
+    def _write_meta(self, meta):
+        # Written to a temp file and renamed so readers never see half an index
+        tmp_path = f"{self._meta_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path())
+        self.touch()
+
+    def set_file(self, role, path):
+        meta = self._read_meta()
+        meta[role] = os.path.basename(path)
+        self._write_meta(meta)
+
+    def get_file(self, role):
+        """Path of the file stored for `role`, or None."""
+        name = self._read_meta().get(role)
+        if not name:
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+    def set_value(self, name, value):
+        """Store a small non-file value (e.g. the reference's library key)."""
+        meta = self._read_meta()
+        meta.setdefault("values", {})[name] = value
+        self._write_meta(meta)
+
+    def get_value(self, name):
+        return self._read_meta().get("values", {}).get(name)
+
+    def contains(self, filename):
+        """True if filename is a stored audio file of this session."""
+        return filename in self._read_meta().values()
+
+
+class WorkspaceManager:
+    def __init__(self, root=WORKSPACE_ROOT, ttl=SESSION_TTL, quota_bytes=WORKSPACE_QUOTA_BYTES):
+        self.root = root
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self._cleaner = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def create(self):
+        session_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, session_id)
+        os.makedirs(directory)
+        return Session(session_id, directory)
+
+    def get(self, session_id):
+        if not session_id or not _SESSION_ID.match(session_id):
+            return None
+        directory = os.path.join(self.root, session_id)
+        if not os.path.isdir(directory):
+            return None
+        session = Session(session_id, directory)
+        session.touch()
+        return session
+
+    def _sessions(self):
+        sessions = []
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if not _SESSION_ID.match(name) or not os.path.isdir(directory):
+                continue
+            try:
+                last_used = os.stat(directory).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+            except OSError:
+                continue
+            sessions.append((last_used, size, directory))
+        return sessions
+
+    def cleanup(self):
+        """Delete expired sessions, then the oldest ones while over quota."""
+        sessions = sorted(self._sessions())
+        total = sum(size for _, size, _ in sessions)
+        cutoff = time.time() - self.ttl
+        removed = 0
+
+        for last_used, size, directory in sessions:
+            if last_used >= cutoff and total <= self.quota_bytes:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        if removed:
+            print(f"Removed {removed} idle session(s) from {self.root}")
+        return removed
+
+    def start_cleanup(self, interval=CLEANUP_INTERVAL):
+        """Run cleanup() every `interval` seconds on a daemon thread."""
+        if self._cleaner is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.cleanup()
+                except Exception as e:
+                    print(f"Session cleanup failed: {str(e)}")
+
+        self._cleaner = threading.Thread(target=loop, daemon=True, name="workspace-cleanup")
+        self._cleaner.start()
+
+
+workspaces = WorkspaceManager()